@@ -0,0 +1,35 @@
+"""
+プリンシプルBSDF → マテリアル出力 という共通構成のマテリアルを、
+テンプレートの複製と入力値の設定だけで作成するための補助モジュール
+"""
+import bpy
+
+# 既定のノードツリーをそのまま使うテンプレートマテリアルの名前
+_TEMPLATE_NAME = "_principled_template"
+
+
+def get_principled_template():
+    """テンプレートマテリアルを返す（シーンのクリアで削除されていれば作り直す）"""
+    template = bpy.data.materials.get(_TEMPLATE_NAME)
+    if template is None:
+        template = bpy.data.materials.new(_TEMPLATE_NAME)
+        # 新規マテリアルの既定ツリーは接続済みのプリンシプルBSDFとマテリアル出力なので、ノードは組み直さない
+        template.use_nodes = True
+    return template
+
+
+def principled_material(name, inputs):
+    """
+    プリンシプルBSDFの入力値だけを設定したマテリアルを返す。
+    同名のマテリアルが既にあれば複製せず、入力値だけを更新して再利用する。
+      - inputs: 入力ソケット名と値の辞書（例: {"Base Color": (1, 1, 1, 1), "Roughness": 0.5}）
+    """
+    mat = bpy.data.materials.get(name)
+    if mat is None:
+        mat = get_principled_template().copy()
+        mat.name = name
+
+    principled = mat.node_tree.nodes["Principled BSDF"]
+    for socket_name, value in inputs.items():
+        principled.inputs[socket_name].default_value = value
+    return mat
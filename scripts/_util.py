@@ -0,0 +1,224 @@
+"""
+handson スクリプトで共通して使う出力先・レンダリングデバイスまわりの補助モジュール
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import bpy
+
+# GPU バックエンドを探す順番（NVIDIA → AMD → Apple → Intel）
+GPU_BACKENDS = ("OPTIX", "CUDA", "HIP", "METAL", "ONEAPI")
+
+
+def ensure_output(name="output"):
+    """
+    出力ディレクトリを作成してその絶対パスを返す（既に存在していてもエラーにしない）。
+    環境変数 BLENDER_SCRATCH_OUT=1 のときは RAM ディスク上に書き出す。
+      - name: 出力ディレクトリ名（通常はカレントディレクトリからの相対パス）
+    """
+    if os.environ.get("BLENDER_SCRATCH_OUT") == "1":
+        # Linux は tmpfs の /dev/shm、それ以外は OS の一時ディレクトリを使う
+        base_dir = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        output_dir = os.path.join(base_dir, "blender_out")
+        # 確認用の一時出力なので PNG の圧縮を省いて書き込みを速くする
+        bpy.context.scene.render.image_settings.compression = 0
+    else:
+        output_dir = os.path.abspath(name)
+    os.makedirs(output_dir, exist_ok=True)
+    return output_dir
+
+
+def parse_gpu_index():
+    """Blender の引数のうち "--" 以降の --gpu-index（run_all.py が指定）を返す"""
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="使用する GPU を指定してレンダリング")
+    parser.add_argument("--gpu-index", type=int, help="使用する GPU の番号（省略時はすべての GPU、負の値なら CPU のみ）")
+    return parser.parse_known_args(argv)[0].gpu_index
+
+
+def enable_best_gpu(gpu_index=None):
+    """
+    Cycles の計算デバイスを、デバイスが見つかった最初の GPU バックエンドに切り替える。
+    有効にしたバックエンド名を返し、GPU がなければ CPU のまま None を返す。
+      - gpu_index: 指定するとそのバックエンドの GPU のうち 1 枚だけを使う（並列実行用）。
+        負の値なら GPU を使わず CPU のまま None を返す
+    """
+    if gpu_index is not None and gpu_index < 0:
+        return None
+    prefs = bpy.context.preferences.addons["cycles"].preferences
+    for backend in GPU_BACKENDS:
+        try:
+            prefs.compute_device_type = backend
+        except TypeError:
+            # このビルドでは未対応のバックエンド
+            continue
+        prefs.get_devices()
+        if any(device.type == backend for device in prefs.devices):
+            break
+    else:
+        return None
+
+    # GPU デバイスのみを有効化し、CPU は無効化
+    for device in prefs.devices:
+        device.use = device.type == backend
+    if gpu_index is not None:
+        # 並列実行時はプロセスごとに別の GPU を使う
+        gpus = [device for device in prefs.devices if device.use]
+        for i, device in enumerate(gpus):
+            device.use = i == gpu_index % len(gpus)
+    bpy.context.scene.cycles.device = "GPU"
+    return backend
+
+
+def setup_denoised_sampling(scene, samples=32, adaptive_threshold=0.02, backend=None):
+    """
+    少ないサンプル数・アダプティブサンプリング・デノイザーの組み合わせで Cycles のノイズを抑える。
+      - backend: enable_best_gpu() の戻り値（OptiX のときだけ OptiX デノイザーを使う）
+    """
+    cycles = scene.cycles
+    cycles.samples = samples
+    cycles.use_adaptive_sampling = True
+    cycles.adaptive_threshold = adaptive_threshold
+    cycles.use_denoising = True
+    # OpenImageDenoise は CPU / GPU のどちらでも動作する
+    cycles.denoiser = "OPTIX" if backend == "OPTIX" else "OPENIMAGEDENOISE"
+    cycles.denoising_use_gpu = True
+
+
+def shard_ranges(frame_start, frame_end, shards):
+    """フレーム範囲をほぼ均等な連続区間に分ける（例: 1〜72 を 2 分割 → [(1, 36), (37, 72)]）"""
+    total = frame_end - frame_start + 1
+    shards = max(1, min(shards, total))
+    ranges = []
+    start = frame_start
+    for i in range(shards):
+        # 割り切れない分は先頭のシャードに 1 フレームずつ配る
+        end = start + total // shards + (1 if i < total % shards else 0) - 1
+        ranges.append((start, end))
+        start = end + 1
+    return ranges
+
+
+def render_animation_shards(output_file, shards, gpus=0):
+    """
+    現在のシーンを一時的な .blend に保存し、フレーム範囲を分割して別々の Blender プロセスで
+    シーンの出力設定のままレンダリングする。シーンは保存時点のものを全プロセスで共有する。
+    動画（FFMPEG / H264 など）はシャードごとに書き出し、ffmpeg の concat で再エンコードせずに
+    1 本につなげる。シャードは output_file と同じフォルダに書き出すので、連結できなくても消えない。
+    連番画像はフレーム番号付きのファイル名で直接 output_file に書き出すので連結しない。
+      - output_file: 動画のファイルパス、または連番画像のファイル名の前半
+      - shards: 起動する Blender プロセス数
+      - gpus: シャードに割り当てる GPU の枚数（CUDA_VISIBLE_DEVICES で 1 枚ずつ。0 なら指定しない）。
+        CUDA_VISIBLE_DEVICES が効くのは Cycles の CUDA / OptiX だけで、EEVEE や HIP / Metal / oneAPI では
+        すべてのシャードが同じ GPU を使う
+    """
+    scene = bpy.context.scene
+    # 一時 .blend からの相対パス（//）にならないよう、子プロセスには絶対パスで渡す
+    output_file = os.path.abspath(output_file)
+    is_movie = scene.render.is_movie_format
+    base, ext = os.path.splitext(output_file)
+    part_files = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        blend_path = os.path.join(tmp_dir, "scene.blend")
+        # 現在のセッションのファイルパスは変えずにコピーとして保存
+        bpy.ops.wm.save_as_mainfile(filepath=blend_path, copy=True)
+
+        processes = []
+        for i, (start, end) in enumerate(shard_ranges(scene.frame_start, scene.frame_end, shards)):
+            if is_movie:
+                # 拡張子付きのパスなので、Blender はフレーム範囲を付け足さずにそのまま書き出す
+                part_file = f"{base}_part{i}{ext}"
+                part_files.append(part_file)
+            else:
+                # 連番画像はフレーム番号でファイル名が分かれるので、全シャードで同じ出力先を使う
+                part_file = output_file
+            command = [
+                bpy.app.binary_path, "--background", blend_path,
+                "--frame-start", str(start), "--frame-end", str(end),
+                "--render-output", part_file, "--render-anim",
+            ]
+            env = os.environ.copy()
+            if gpus > 0:
+                # 同じ GPU を複数のシャードで取り合わないよう 1 枚ずつ見せる
+                env["CUDA_VISIBLE_DEVICES"] = str(i % gpus)
+            processes.append(subprocess.Popen(command, env=env))
+
+        # 一時 .blend を消す前に、失敗したシャードがあっても全プロセスの終了を待つ
+        returncodes = [process.wait() for process in processes]
+    if any(code != 0 for code in returncodes):
+        raise RuntimeError(f"レンダリングに失敗したシャードがあります: {returncodes}")
+    if not is_movie:
+        return
+
+    # 同じ設定でエンコードした動画同士なので、再エンコードせずにストリームをコピーして連結する
+    list_file = f"{base}_parts.txt"
+    with open(list_file, "w", encoding="utf-8") as f:
+        for part_file in part_files:
+            f.write(f"file '{part_file}'\n")
+    try:
+        subprocess.run(
+            ["ffmpeg", "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+             "-i", list_file, "-c", "copy", output_file],
+            check=True,
+        )
+    except FileNotFoundError:
+        print(f"ffmpeg が見つからないため連結しませんでした。シャードの出力: {part_files}")
+        return
+    finally:
+        os.remove(list_file)
+    for part_file in part_files:
+        os.remove(part_file)
+
+
+def is_headless():
+    """Linux でディスプレイ（X11 / Wayland）が使えない環境かどうかを返す"""
+    return sys.platform.startswith("linux") and not (
+        os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY")
+    )
+
+
+def select_eevee(scene, fallback_samples=32):
+    """
+    レンダリングエンジンを EEVEE（4.2 以降は EEVEE Next）にする。
+    EEVEE は OpenGL のコンテキストが必要なため、ディスプレイのない Linux では
+    Cycles の CPU レンダリングに切り替える（EEVEE を選べたら True を返す）。
+      - fallback_samples: Cycles に切り替えたときのサンプル数（既定の 4096 のままにしない）
+    """
+    if is_headless():
+        print("ディスプレイがないため Cycles (CPU) でレンダリングします")
+        scene.render.engine = "CYCLES"
+        scene.cycles.device = "CPU"
+        setup_denoised_sampling(scene, samples=fallback_samples)
+        return False
+
+    try:
+        scene.render.engine = "BLENDER_EEVEE_NEXT"
+    except TypeError:
+        # EEVEE Next のない 4.1 以前
+        scene.render.engine = "BLENDER_EEVEE"
+    return True
+
+
+def select_engine(scene):
+    """
+    BLENDER_ENGINE=EEVEE なら select_eevee() で EEVEE（4.2 以降は EEVEE Next）を選び、
+    それ以外は Cycles を選ぶ（Cycles になったら True を返す）。
+    ディスプレイがなく EEVEE を使えない場合も Cycles になるので、呼び出し側で Cycles の設定をする。
+    """
+    if os.environ.get("BLENDER_ENGINE", "CYCLES").upper() != "EEVEE" or not select_eevee(scene):
+        scene.render.engine = "CYCLES"
+        return True
+
+    eevee = scene.eevee
+    eevee.taa_render_samples = 32
+    # 従来 EEVEE のブルーム／スクリーンスペース反射（EEVEE Next ではレイトレーシングに統合）
+    if hasattr(eevee, "use_bloom"):
+        eevee.use_bloom = True
+    if hasattr(eevee, "use_ssr"):
+        eevee.use_ssr = True
+    if hasattr(eevee, "use_raytracing"):
+        eevee.use_raytracing = True
+    return False
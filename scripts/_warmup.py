@@ -0,0 +1,56 @@
+"""
+同じ Blender セッションで複数の handson スクリプトを続けて実行する場合に、
+Cycles のカーネル／シェーダーの初期化を最初の 1 回だけ済ませておくための補助モジュール
+"""
+import bpy
+
+# bpy.app.driver_namespace はセッション中保持されるため、実行済みフラグの保存に使う
+_WARMED_KEY = "handson_cycles_warmed"
+
+
+def warm_up_cycles(enable_gpu=None):
+    """
+    4×4 ピクセル・1 サンプルのレンダリングを一度実行して Cycles を初期化する。
+    セッション内で既に実行済みの場合は何もしない。
+    レンダリング設定は実行前の状態に戻す（enable_gpu が切り替えた計算デバイスも含む）。
+      - enable_gpu: GPU デバイスを有効化する関数（省略時は現在のデバイス設定のまま）
+    """
+    namespace = bpy.app.driver_namespace
+    if namespace.get(_WARMED_KEY):
+        return False
+
+    scene = bpy.context.scene
+    render = scene.render
+    saved = (
+        render.engine,
+        render.resolution_x,
+        render.resolution_y,
+        render.resolution_percentage,
+        scene.cycles.samples,
+        scene.cycles.device,
+    )
+    try:
+        render.engine = "CYCLES"
+        if enable_gpu is not None:
+            enable_gpu()
+        render.resolution_x = 4
+        render.resolution_y = 4
+        render.resolution_percentage = 100
+        scene.cycles.samples = 1
+        bpy.ops.render.render(write_still=False)
+    except RuntimeError as e:
+        # カメラがないシーンなどではウォームアップを省略
+        print(f"Cycles のウォームアップを省略しました: {e}")
+        return False
+    finally:
+        (
+            render.engine,
+            render.resolution_x,
+            render.resolution_y,
+            render.resolution_percentage,
+            scene.cycles.samples,
+            scene.cycles.device,
+        ) = saved
+
+    namespace[_WARMED_KEY] = True
+    return True
@@ -1,7 +1,27 @@
 import math
-import random
+import os
+import sys
 
+import bmesh
 import bpy
+import numpy as np
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import enable_best_gpu  # pylint: disable=wrong-import-position
+from _warmup import warm_up_cycles  # pylint: disable=wrong-import-position
+
+CUBE_COUNT = 5
+
+
+def clear_scene():
+    # オペレーターを使わず bpy.data から直接削除（選択同期や Undo 登録を省く）
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 
 def setup_camera():
@@ -28,32 +48,44 @@ def setup_light():
     return sun, area
 
 
+def create_cube(name, location, scale):
+    # bmesh で立方体メッシュを直接構築（オペレーター呼び出しによる更新処理を回避）
+    mesh = bpy.data.meshes.new(name)
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=2.0)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    cube = bpy.data.objects.new(name, mesh)
+    cube.location = location
+    cube.scale = (scale, scale, scale)
+    bpy.context.collection.objects.link(cube)
+    return cube
+
+
 def main():
+    # 同一セッション内で最初の 1 回だけ Cycles を初期化しておく
+    if os.environ.get("RENDER", "1") == "1":
+        warm_up_cycles(enable_best_gpu)
+
     # Blenderの初期化（既存のオブジェクトを削除）
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete()
+    clear_scene()
 
     # カメラとライトのセットアップ
     camera = setup_camera()
     sun, area = setup_light()
 
-    # キューブを5個生成
-    for i in range(5):
-        # ランダムな位置を生成
-        x = random.uniform(-5, 5)
-        y = random.uniform(-5, 5)
-        z = random.uniform(0, 5)
-
-        # キューブを追加
-        bpy.ops.mesh.primitive_cube_add(location=(x, y, z))
+    # 全キューブ分のランダムな位置とスケールを一括で生成
+    rng = np.random.default_rng()
+    positions = rng.uniform((-5, -5, 0), (5, 5, 5), (CUBE_COUNT, 3))
+    scales = rng.uniform(0.5, 2.0, CUBE_COUNT)
 
-        # 現在のキューブの名前を設定
-        current_cube = bpy.context.active_object
-        current_cube.name = f"RandomCube_{i+1}"
+    # キューブを生成
+    for i in range(CUBE_COUNT):
+        create_cube(f"RandomCube_{i+1}", tuple(positions[i]), float(scales[i]))
 
-        # ランダムなスケールを設定
-        scale = random.uniform(0.5, 2.0)
-        current_cube.scale = (scale, scale, scale)
+    # 全キューブ生成後に一度だけシーンを更新
+    bpy.context.view_layer.update()
 
     # レンダリング設定
     bpy.context.scene.render.image_settings.file_format = "PNG"
@@ -61,15 +93,36 @@ def main():
 
     # レンダリングエンジンをCyclesに設定（より良い品質のため）
     bpy.context.scene.render.engine = "CYCLES"
-    bpy.context.scene.cycles.samples = 128  # レンダリングサンプル数
+    bpy.context.scene.cycles.samples = 32  # レンダリングサンプル数
+    # デノイザーを有効にして少ないサンプル数でもノイズを抑える
+    # （OpenImageDenoise は CPU / GPU のどちらでも利用可能）
+    bpy.context.scene.cycles.use_denoising = True
+    bpy.context.scene.cycles.denoiser = "OPENIMAGEDENOISE"
+    bpy.context.scene.cycles.denoising_input_passes = "RGB_ALBEDO_NORMAL"
+    bpy.context.scene.cycles.use_adaptive_sampling = True
+    bpy.context.scene.cycles.adaptive_threshold = 0.01
+    enable_best_gpu()
+    # 小規模シーンなのでタイル分割せず、画像全体を 1 タイルでレンダリング
+    bpy.context.scene.cycles.use_auto_tile = False
+    bpy.context.scene.cycles.tile_size = max(
+        bpy.context.scene.render.resolution_x, bpy.context.scene.render.resolution_y
+    )
+
+    # レンダリング中の UI 更新を止め、構築済みのシーンをそのまま評価させる
+    bpy.context.scene.render.use_lock_interface = True
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
 
     # レンダリングを実行
     bpy.ops.render.render(write_still=True)
+    print("ランダムな位置にキューブを生成し、レンダリングが完了しました。")
 
 
 if __name__ == "__main__":
     try:
         main()
-        print("ランダムな位置にキューブを生成し、レンダリングが完了しました。")
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
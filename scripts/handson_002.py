@@ -1,12 +1,30 @@
 import bpy
+import bmesh
 import random
 import math
+import os
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu  # pylint: disable=wrong-import-position
+from _warmup import warm_up_cycles  # pylint: disable=wrong-import-position
+
+
+def clear_scene():
+    # オペレーターを使わず bpy.data から直接削除（選択同期や Undo 登録を省く）
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 
 def setup_scene():
     # シーンをクリア
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete()
+    clear_scene()
 
     # カメラを追加
     bpy.ops.object.camera_add(location=(15, -15, 8))
@@ -20,47 +38,92 @@ def setup_scene():
     sun.data.energy = 3.0
 
 
-def create_colored_material(name, base_color):
-    material = bpy.data.materials.new(name=name)
-    material.use_nodes = True
-    nodes = material.node_tree.nodes
-
-    # ノードをクリア
-    nodes.clear()
-
-    # プリンシプルBSDFを追加
-    principled = nodes.new("ShaderNodeBsdfPrincipled")
-    principled.inputs["Base Color"].default_value = base_color
-    principled.inputs["Metallic"].default_value = 0.7
-    principled.inputs["Roughness"].default_value = 0.2
+# 全オブジェクト共通のマテリアル設定（ベースカラーだけをオブジェクトごとに変える）
+MATERIAL_INPUTS = {"Metallic": 0.7, "Roughness": 0.2}
 
-    # マテリアル出力を追加
-    output = nodes.new("ShaderNodeOutputMaterial")
 
-    # ノードを接続
-    material.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
-
-    return material
+def create_colored_material(name, base_color):
+    # _matlib のテンプレートを複製し、ベースカラーだけを差し替える
+    return principled_material(name, {**MATERIAL_INPUTS, "Base Color": base_color})
+
+
+def build_torus(bm, major_segments, minor_segments, major_radius=1.0, minor_radius=0.25):
+    # bmesh にはトーラス生成オペレーターがないため、頂点と面を直接構築
+    verts = []
+    for i in range(major_segments):
+        theta = 2 * math.pi * i / major_segments
+        for j in range(minor_segments):
+            phi = 2 * math.pi * j / minor_segments
+            radius = major_radius + minor_radius * math.cos(phi)
+            verts.append(
+                bm.verts.new(
+                    (
+                        radius * math.cos(theta),
+                        radius * math.sin(theta),
+                        minor_radius * math.sin(phi),
+                    )
+                )
+            )
+
+    for i in range(major_segments):
+        next_i = (i + 1) % major_segments
+        for j in range(minor_segments):
+            next_j = (j + 1) % minor_segments
+            bm.faces.new(
+                (
+                    verts[i * minor_segments + j],
+                    verts[next_i * minor_segments + j],
+                    verts[next_i * minor_segments + next_j],
+                    verts[i * minor_segments + next_j],
+                )
+            )
 
 
 def create_abstract_shape():
     shapes = ["CONE", "SPHERE", "CYLINDER", "TORUS"]
     shape_type = random.choice(shapes)
 
+    # bmesh でメッシュを直接構築（寸法は bpy.ops のプリミティブと同じ既定値）
+    bm = bmesh.new()
     if shape_type == "CONE":
-        bpy.ops.mesh.primitive_cone_add(vertices=random.randint(3, 8))
+        bmesh.ops.create_cone(
+            bm,
+            cap_ends=True,
+            segments=random.randint(3, 8),
+            radius1=1.0,
+            radius2=0.0,
+            depth=2.0,
+        )
     elif shape_type == "SPHERE":
-        bpy.ops.mesh.primitive_uv_sphere_add(
-            segments=random.randint(8, 16), ring_count=random.randint(8, 16)
+        bmesh.ops.create_uvsphere(
+            bm,
+            u_segments=random.randint(8, 16),
+            v_segments=random.randint(8, 16),
+            radius=1.0,
         )
     elif shape_type == "CYLINDER":
-        bpy.ops.mesh.primitive_cylinder_add(vertices=random.randint(6, 12))
+        bmesh.ops.create_cone(
+            bm,
+            cap_ends=True,
+            segments=random.randint(6, 12),
+            radius1=1.0,
+            radius2=1.0,
+            depth=2.0,
+        )
     else:  # TORUS
-        bpy.ops.mesh.primitive_torus_add(
-            major_segments=random.randint(12, 24), minor_segments=random.randint(6, 12)
+        build_torus(
+            bm,
+            major_segments=random.randint(12, 24),
+            minor_segments=random.randint(6, 12),
         )
 
-    obj = bpy.context.active_object
+    name = shape_type.capitalize()
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(obj)
 
     # ランダムな変形を適用
     obj.scale = (
@@ -79,6 +142,10 @@ def create_abstract_shape():
 
 
 def main():
+    # 同一セッション内で最初の 1 回だけ Cycles を初期化しておく
+    if os.environ.get("RENDER", "1") == "1":
+        warm_up_cycles(enable_best_gpu)
+
     setup_scene()
 
     # グラウンドプレーン（床）を作成
@@ -106,21 +173,45 @@ def main():
         mat = create_colored_material(f"Material_{i}", color)
         obj.data.materials.append(mat)
 
+    # 全オブジェクト生成後に一度だけシーンを更新
+    bpy.context.view_layer.update()
+
     # レンダリング設定
     bpy.context.scene.render.engine = "CYCLES"
-    bpy.context.scene.cycles.samples = 128
+    bpy.context.scene.cycles.samples = 32
+    # デノイザーを有効にして少ないサンプル数でもノイズを抑える
+    # （OpenImageDenoise は CPU / GPU のどちらでも利用可能）
+    bpy.context.scene.cycles.use_denoising = True
+    bpy.context.scene.cycles.denoiser = "OPENIMAGEDENOISE"
+    bpy.context.scene.cycles.denoising_input_passes = "RGB_ALBEDO_NORMAL"
+    bpy.context.scene.cycles.use_adaptive_sampling = True
+    bpy.context.scene.cycles.adaptive_threshold = 0.01
+    enable_best_gpu()
     bpy.context.scene.render.resolution_x = 1920
     bpy.context.scene.render.resolution_y = 1080
+    # 小規模シーンなのでタイル分割せず、画像全体を 1 タイルでレンダリング
+    bpy.context.scene.cycles.use_auto_tile = False
+    bpy.context.scene.cycles.tile_size = max(
+        bpy.context.scene.render.resolution_x, bpy.context.scene.render.resolution_y
+    )
     bpy.context.scene.render.image_settings.file_format = "PNG"
     bpy.context.scene.render.filepath = ".//output//handson_002.png"
 
+    # レンダリング中の UI 更新を止め、構築済みのシーンをそのまま評価させる
+    bpy.context.scene.render.use_lock_interface = True
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     # レンダリングを実行
     bpy.ops.render.render(write_still=True)
+    print("抽象的なシーンの生成とレンダリングが完了しました。")
 
 
 if __name__ == "__main__":
     try:
         main()
-        print("抽象的なシーンの生成とレンダリングが完了しました。")
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
@@ -1,11 +1,32 @@
-import bpy
+import argparse
 import math
+import os
+import sys
+
+import bpy
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import render_animation_shards  # pylint: disable=wrong-import-position
+
+# keyframe_points.foreach_set で使う列挙値（KeyframeInterpolation / KeyframeEasing）
+INTERPOLATION_BEZIER = 2
+EASING_EASE_IN_OUT = 3
+
+
+def clear_scene():
+    # オペレーターを使わず bpy.data から直接削除（選択同期や Undo 登録を省く）
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 
 def setup_scene():
     # シーンをクリア
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete()
+    clear_scene()
 
     # カメラをセットアップ
     bpy.ops.object.camera_add(location=(0, -10, 5))
@@ -26,6 +47,11 @@ def setup_scene():
 
 
 def create_text_material():
+    # 構築済みのマテリアルがあれば再利用
+    material = bpy.data.materials.get("TextMaterial")
+    if material is not None:
+        return material
+
     material = bpy.data.materials.new(name="TextMaterial")
     material.use_nodes = True
     nodes = material.node_tree.nodes
@@ -71,35 +97,57 @@ def create_text_animation(text_obj, frames=24):
     bpy.context.scene.frame_start = 1
     bpy.context.scene.frame_end = frames
 
-    # 最初のキーフレーム（1フレーム目）
-    bpy.context.scene.frame_set(1)
+    # キーフレーム位置（最初・中間・最後）
+    keyframes = (1, frames // 2, frames)
+
+    # チャンネルごとの各キーフレームでの値
+    channels = {
+        ("location", 0): (0, 0, 0),
+        ("location", 1): (0, 0, 0),
+        ("location", 2): (1, 2, 1),
+        ("rotation_euler", 0): (0, 0, 0),
+        ("rotation_euler", 1): (0, 0, 0),
+        ("rotation_euler", 2): (0, math.pi, math.pi * 2),
+    }
+
+    # 1フレーム目の姿勢
     text_obj.location = (0, 0, 1)
     text_obj.rotation_euler = (0, 0, 0)
-    text_obj.keyframe_insert(data_path="location")
-    text_obj.keyframe_insert(data_path="rotation_euler")
-
-    # 中間キーフレーム
-    bpy.context.scene.frame_set(frames // 2)
-    text_obj.location = (0, 0, 2)
-    text_obj.rotation_euler = (0, 0, math.pi)
-    text_obj.keyframe_insert(data_path="location")
-    text_obj.keyframe_insert(data_path="rotation_euler")
-
-    # 最後のキーフレーム
-    bpy.context.scene.frame_set(frames)
-    text_obj.location = (0, 0, 1)
-    text_obj.rotation_euler = (0, 0, math.pi * 2)
-    text_obj.keyframe_insert(data_path="location")
-    text_obj.keyframe_insert(data_path="rotation_euler")
 
-    # アニメーションカーブをスムーズに
-    for fc in text_obj.animation_data.action.fcurves:
-        for kf in fc.keyframe_points:
-            kf.interpolation = "BEZIER"
-            kf.easing = "EASE_IN_OUT"
+    # frame_set / keyframe_insert を使わず、FCurve にキーフレームを一括で書き込む
+    action = bpy.data.actions.new(name=f"{text_obj.name}Action")
+    text_obj.animation_data_create().action = action
+
+    count = len(keyframes)
+    for (data_path, index), values in channels.items():
+        fc = action.fcurves.new(
+            data_path=data_path, index=index, action_group="Object Transforms"
+        )
+        points = fc.keyframe_points
+        points.add(count)
+        points.foreach_set(
+            "co", [c for frame, value in zip(keyframes, values) for c in (frame, value)]
+        )
+
+        # アニメーションカーブをスムーズに
+        points.foreach_set("interpolation", [INTERPOLATION_BEZIER] * count)
+        points.foreach_set("easing", [EASING_EASE_IN_OUT] * count)
+        fc.update()
+
+
+def parse_args():
+    # Blender の引数のうち "--" 以降をスクリプト用の引数として解釈
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="3Dテキストアニメーションをレンダリング")
+    parser.add_argument(
+        "--shards", type=int, default=1, help="フレーム範囲を分割して並列にレンダリングするプロセス数"
+    )
+    return parser.parse_known_args(argv)[0]
 
 
 def main():
+    args = parse_args()
+
     # シーンのセットアップ
     camera, sun, plane = setup_scene()
 
@@ -113,16 +161,43 @@ def main():
     bpy.context.scene.render.engine = "BLENDER_EEVEE"  # 正しいエンジン名に修正
     bpy.context.scene.render.resolution_x = 960
     bpy.context.scene.render.resolution_y = 540
-    bpy.context.scene.render.image_settings.file_format = "PNG"
+
+    # マテリアルは静的なので TAA サンプル数を抑え、不要なポストエフェクトを無効化
+    eevee = bpy.context.scene.eevee
+    eevee.taa_render_samples = 16
+    if hasattr(eevee, "use_gtao"):
+        eevee.use_gtao = False
+    if hasattr(eevee, "use_bloom"):
+        eevee.use_bloom = False
+    # 連番フレームは PNG より圧縮が軽い JPEG で書き出す（プレビュー用途）
+    bpy.context.scene.render.image_settings.file_format = "JPEG"
+    bpy.context.scene.render.image_settings.quality = 90
     bpy.context.scene.render.filepath = "//output//frame_"
 
+    scene = bpy.context.scene
+
+    # 環境変数 RENDER_FRAMES で終了フレームを短縮（確認用）
+    if os.environ.get("RENDER_FRAMES"):
+        scene.frame_end = int(os.environ["RENDER_FRAMES"])
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     # アニメーションをレンダリング
-    bpy.ops.render.render(animation=True)
+    if args.shards > 1:
+        # 構築済みのシーンを保存し、分割したフレーム範囲を別々の Blender プロセスで描画する
+        render_animation_shards(bpy.path.abspath(scene.render.filepath), args.shards)
+    else:
+        bpy.ops.render.render(animation=True)
+    print("3Dテキストアニメーションの生成とレンダリングが完了しました。")
 
 
 if __name__ == "__main__":
     try:
         main()
-        print("3Dテキストアニメーションの生成とレンダリングが完了しました。")
     except Exception as e:
         print(f"エラーが発生しました: {str(e)}")
+        # --python-exit-code 1 付きで起動したとき（run_all.py など）に失敗を終了コードへ反映させる
+        raise
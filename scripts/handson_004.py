@@ -1,11 +1,46 @@
 import bpy
+import argparse
 import math
+import os
 import random
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import render_animation_shards  # pylint: disable=wrong-import-position
+
+# パーティクル（噴水）の設定
+PARTICLE_COUNT = 500                 # 発生するパーティクル数（エミッタ面積 1 あたり）
+PARTICLE_EMIT_FRAME = 1              # 一括発生するフレーム
+PARTICLE_VELOCITY_MIN = (-0.5, -0.5, 4.5)  # 初速度の範囲（上方向 5.0 ± 0.5）
+PARTICLE_VELOCITY_MAX = (0.5, 0.5, 5.5)
+GRAVITY = 9.81
+PARTICLE_RANDOM_ATTRIBUTE = "rnd"    # マテリアルの色分けに使う乱数属性名
+PARTICLE_MATERIAL_NAME = "ParticleInstance_Mat"  # 全インスタンスで共有するマテリアル名
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
+
+def set_material(obj, mat):
+    """オブジェクトの先頭マテリアルスロットにマテリアルを設定する"""
+    if obj.data.materials:
+        obj.data.materials[0] = mat
+    else:
+        obj.data.materials.append(mat)
+
+def create_colored_material(name, base_color):
+    """
+    _matlib のプリンシプルBSDFテンプレートを複製し、Base Color だけを差し替える。
+    ノードツリーの構築はテンプレート作成時の一度だけになります。
+    """
+    return principled_material(name, {"Base Color": base_color})
 
 def assign_random_color_material(obj):
     """
@@ -14,16 +49,10 @@ def assign_random_color_material(obj):
     """
     if not hasattr(obj.data, "materials"):
         return
-    mat = bpy.data.materials.new(name=f"{obj.name}_Mat")
-    mat.use_nodes = True
-    bsdf = mat.node_tree.nodes.get("Principled BSDF")
-    if bsdf:
-        bsdf.inputs["Base Color"].default_value = (
-            random.random(), random.random(), random.random(), 1.0)
-    if obj.data.materials:
-        obj.data.materials[0] = mat
-    else:
-        obj.data.materials.append(mat)
+    mat = create_colored_material(
+        f"{obj.name}_Mat",
+        (random.random(), random.random(), random.random(), 1.0))
+    set_material(obj, mat)
 
 def assign_ground_material(obj):
     """
@@ -32,26 +61,26 @@ def assign_ground_material(obj):
     """
     if not hasattr(obj.data, "materials"):
         return
-    mat = bpy.data.materials.new(name=f"{obj.name}_Mat")
-    mat.use_nodes = True
-    bsdf = mat.node_tree.nodes.get("Principled BSDF")
-    if bsdf:
-        # 例：グリーン系の色 (RGB: 0.2, 0.5, 0.2)
-        bsdf.inputs["Base Color"].default_value = (0.2, 0.5, 0.2, 1.0)
-    if obj.data.materials:
-        obj.data.materials[0] = mat
-    else:
-        obj.data.materials.append(mat)
+    # 例：グリーン系の色 (RGB: 0.2, 0.5, 0.2)
+    mat = create_colored_material(f"{obj.name}_Mat", (0.2, 0.5, 0.2, 1.0))
+    set_material(obj, mat)
 
 def assign_particle_instance_material(obj):
     """
     パーティクルインスタンス用のマテリアルを設定します。
-    Particle Info ノードと ColorRamp を利用して、各パーティクルに対して
-    異なる色を生成します（例：赤～緑～青のグラデーション）。
+    インスタンスごとに格納された 'rnd' 属性と ColorRamp を利用して、
+    各パーティクルに対して異なる色を生成します（例：赤～緑～青のグラデーション）。
+    色の違いは属性値で得られるため、マテリアルは一度だけ構築して
+    全インスタンスで共有します。
     """
     if not hasattr(obj.data, "materials"):
         return
-    mat = bpy.data.materials.new(name=f"{obj.name}_Mat")
+    # 構築済みなら名前で引いて使い回す
+    mat = bpy.data.materials.get(PARTICLE_MATERIAL_NAME)
+    if mat is not None:
+        set_material(obj, mat)
+        return
+    mat = bpy.data.materials.new(name=PARTICLE_MATERIAL_NAME)
     mat.use_nodes = True
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
@@ -68,9 +97,11 @@ def assign_particle_instance_material(obj):
     principled_node = nodes.new(type="ShaderNodeBsdfPrincipled")
     principled_node.location = (200, 0)
 
-    # Particle Info ノード
-    particle_info = nodes.new(type="ShaderNodeParticleInfo")
+    # Attribute ノード（Geometry Nodes でインスタンスに格納した乱数を参照）
+    particle_info = nodes.new(type="ShaderNodeAttribute")
     particle_info.location = (0, 0)
+    particle_info.attribute_type = 'INSTANCER'
+    particle_info.attribute_name = PARTICLE_RANDOM_ATTRIBUTE
 
     # ColorRamp ノード
     color_ramp = nodes.new(type="ShaderNodeValToRGB")
@@ -82,14 +113,11 @@ def assign_particle_instance_material(obj):
     mid_elem.color = (0, 1, 0, 1)                             # 緑
 
     # ノード接続
-    links.new(particle_info.outputs["Random"], color_ramp.inputs["Fac"])
+    links.new(particle_info.outputs["Fac"], color_ramp.inputs["Fac"])
     links.new(color_ramp.outputs["Color"], principled_node.inputs["Base Color"])
     links.new(principled_node.outputs["BSDF"], output_node.inputs["Surface"])
 
-    if obj.data.materials:
-        obj.data.materials[0] = mat
-    else:
-        obj.data.materials.append(mat)
+    set_material(obj, mat)
 
 def setup_camera():
     """カメラを配置してシーンのアクティブカメラに設定"""
@@ -124,10 +152,118 @@ def create_ground():
     assign_ground_material(ground)
     return ground
 
+def create_fountain_node_group(instance_obj):
+    """
+    噴水の Geometry Nodes を構築します。
+    エミッタ面上に点を分布させ、各点の位置を放物運動の閉形式
+    （offset = v0 * t + 0.5 * g * t^2）でフレームごとに求めるため、
+    パーティクルシステムのような逐次シミュレーションやキャッシュが不要です。
+    各点には instance_obj をインスタンスとして配置します。
+    """
+    node_group = bpy.data.node_groups.new("Fountain", 'GeometryNodeTree')
+    node_group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+    node_group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+    nodes = node_group.nodes
+    links = node_group.links
+
+    group_input = nodes.new('NodeGroupInput')
+    group_input.location = (-1000, 0)
+    group_output = nodes.new('NodeGroupOutput')
+    group_output.location = (800, 0)
+
+    # エミッタ面上に点を分布（面積 1 の平面に PARTICLE_COUNT 個）
+    distribute = nodes.new('GeometryNodeDistributePointsOnFaces')
+    distribute.location = (-800, 0)
+    distribute.distribute_method = 'RANDOM'
+    distribute.inputs["Density"].default_value = PARTICLE_COUNT
+    links.new(group_input.outputs["Geometry"], distribute.inputs["Mesh"])
+
+    # 色分け用の乱数を点ごとに格納
+    color_random = nodes.new('FunctionNodeRandomValue')
+    color_random.location = (-800, -300)
+    color_random.data_type = 'FLOAT'
+    color_random.inputs["Seed"].default_value = 1
+    store = nodes.new('GeometryNodeStoreNamedAttribute')
+    store.location = (-600, 0)
+    store.data_type = 'FLOAT'
+    store.domain = 'POINT'
+    store.inputs["Name"].default_value = PARTICLE_RANDOM_ATTRIBUTE
+    links.new(distribute.outputs["Points"], store.inputs["Geometry"])
+    links.new(color_random.outputs[1], store.inputs["Value"])
+
+    # 点ごとの初速度 v0
+    velocity = nodes.new('FunctionNodeRandomValue')
+    velocity.location = (-600, 300)
+    velocity.data_type = 'FLOAT_VECTOR'
+    velocity.inputs[0].default_value = PARTICLE_VELOCITY_MIN
+    velocity.inputs[1].default_value = PARTICLE_VELOCITY_MAX
+
+    # 発生からの経過時間 t = (frame - 発生フレーム) / fps
+    fps = bpy.context.scene.render.fps
+    scene_time = nodes.new('GeometryNodeInputSceneTime')
+    scene_time.location = (-600, 500)
+    elapsed = nodes.new('ShaderNodeMath')
+    elapsed.location = (-400, 500)
+    elapsed.operation = 'MULTIPLY_ADD'
+    elapsed.use_clamp = False
+    links.new(scene_time.outputs["Frame"], elapsed.inputs[0])
+    elapsed.inputs[1].default_value = 1.0 / fps
+    elapsed.inputs[2].default_value = -PARTICLE_EMIT_FRAME / fps
+    elapsed_sq = nodes.new('ShaderNodeMath')
+    elapsed_sq.location = (-200, 600)
+    elapsed_sq.operation = 'MULTIPLY'
+    links.new(elapsed.outputs["Value"], elapsed_sq.inputs[0])
+    links.new(elapsed.outputs["Value"], elapsed_sq.inputs[1])
+
+    # v0 * t
+    travel = nodes.new('ShaderNodeVectorMath')
+    travel.location = (-200, 300)
+    travel.operation = 'SCALE'
+    links.new(velocity.outputs[0], travel.inputs[0])
+    links.new(elapsed.outputs["Value"], travel.inputs["Scale"])
+
+    # 0.5 * g * t^2
+    fall = nodes.new('ShaderNodeVectorMath')
+    fall.location = (0, 500)
+    fall.operation = 'SCALE'
+    fall.inputs[0].default_value = (0.0, 0.0, -0.5 * GRAVITY)
+    links.new(elapsed_sq.outputs["Value"], fall.inputs["Scale"])
+
+    offset = nodes.new('ShaderNodeVectorMath')
+    offset.location = (200, 300)
+    offset.operation = 'ADD'
+    links.new(travel.outputs["Vector"], offset.inputs[0])
+    links.new(fall.outputs["Vector"], offset.inputs[1])
+
+    set_position = nodes.new('GeometryNodeSetPosition')
+    set_position.location = (200, 0)
+    links.new(store.outputs["Geometry"], set_position.inputs["Geometry"])
+    links.new(offset.outputs["Vector"], set_position.inputs["Offset"])
+
+    # 各点に小球をインスタンスとして配置
+    instance_info = nodes.new('GeometryNodeObjectInfo')
+    instance_info.location = (200, -300)
+    instance_info.transform_space = 'ORIGINAL'
+    instance_info.inputs["Object"].default_value = instance_obj
+    instance_info.inputs["As Instance"].default_value = True
+    instance_on_points = nodes.new('GeometryNodeInstanceOnPoints')
+    instance_on_points.location = (400, 0)
+    links.new(set_position.outputs["Geometry"], instance_on_points.inputs["Points"])
+    links.new(instance_info.outputs["Geometry"], instance_on_points.inputs["Instance"])
+
+    # エミッタ自身の平面とインスタンスをまとめて出力
+    join = nodes.new('GeometryNodeJoinGeometry')
+    join.location = (600, 0)
+    links.new(instance_on_points.outputs["Instances"], join.inputs["Geometry"])
+    links.new(group_input.outputs["Geometry"], join.inputs["Geometry"])
+    links.new(join.outputs["Geometry"], group_output.inputs["Geometry"])
+
+    return node_group
+
 def create_emitter():
     """
     パーティクルを発生させるエミッタ（小さな平面）を作成し、
-    エミッタにパーティクルシステムを設定します。
+    エミッタに噴水の Geometry Nodes モディファイアを設定します。
     各パーティクルは、Particle Instance 用の大きめの小球オブジェクトをインスタンスとして表示します。
     """
     # エミッタ作成
@@ -136,32 +272,15 @@ def create_emitter():
     emitter.name = "Emitter"
     assign_random_color_material(emitter)
 
-    # エミッタにパーティクルシステムを追加
-    ps_mod = emitter.modifiers.new("ParticleSystem", type='PARTICLE_SYSTEM')
-    psys = ps_mod.particle_system
-    p_settings = psys.settings
-
-    # パーティクル設定（フォンタン効果）
-    p_settings.count = 500            # 発生するパーティクル数
-    p_settings.frame_start = 1        # 発生開始フレーム
-    p_settings.frame_end = 1          # 一括発生
-    p_settings.lifetime = 50          # パーティクルの寿命（フレーム）
-    p_settings.emit_from = 'FACE'
-    p_settings.physics_type = 'NEWTON'
-    p_settings.normal_factor = 5.0    # 上方向への初速度
-    p_settings.factor_random = 0.5    # ランダム性を付与
-    p_settings.use_dynamic_rotation = True
-    p_settings.rotation_mode = 'GLOB_X'
-
     # パーティクル表示用のインスタンスオブジェクト（大きめの小球）作成
     bpy.ops.mesh.primitive_uv_sphere_add(radius=0.3, location=(100, 100, 100))
     particle_obj = bpy.context.active_object
     particle_obj.name = "ParticleInstance"
     assign_particle_instance_material(particle_obj)
-    
-    # パーティクルレンダリング設定：オブジェクトとしてインスタンス化
-    p_settings.render_type = 'OBJECT'
-    p_settings.instance_object = particle_obj
+
+    # エミッタに噴水の Geometry Nodes を追加（フォンタン効果）
+    gn_mod = emitter.modifiers.new("Fountain", type='NODES')
+    gn_mod.node_group = create_fountain_node_group(particle_obj)
 
     return emitter, particle_obj
 
@@ -177,13 +296,27 @@ def setup_scene_for_speed_and_color():
     scene.render.simplify_child_particles = 0
 
     # 画像出力設定（RGBA で出力）
-    scene.render.image_settings.file_format = 'PNG'
+    # PNG の zlib 圧縮より高速な DWAA 圧縮の半精度 OpenEXR で連番を書き出す
+    scene.render.image_settings.file_format = 'OPEN_EXR'
+    scene.render.image_settings.exr_codec = 'DWAA'
+    scene.render.image_settings.color_depth = '16'
     scene.render.image_settings.color_mode = 'RGBA'
     # カラーマネージメントの設定例
     scene.view_settings.view_transform = 'Filmic'
     scene.view_settings.look = 'None'
 
+def parse_args():
+    """Blender の引数のうち "--" 以降をスクリプト用の引数として解釈"""
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="パーティクルの噴水をレンダリング")
+    parser.add_argument(
+        "--shards", type=int, default=1, help="フレーム範囲を分割して並列にレンダリングするプロセス数"
+    )
+    return parser.parse_known_args(argv)[0]
+
 def main():
+    args = parse_args()
+
     # シーン初期化と各要素の配置
     clear_scene()
     setup_camera()
@@ -200,11 +333,26 @@ def main():
     # レンダリング設定（カラフルな出力と高速レンダリングのため）
     setup_scene_for_speed_and_color()
     
-    # 出力先パス（連番PNGとして保存）
+    # 出力先パス（連番EXRとして保存）
     scene.render.filepath = ".//output//particle_fountain_"
-    
+
+    # 環境変数 RENDER_FRAMES で終了フレームを短縮（確認用）
+    if os.environ.get("RENDER_FRAMES"):
+        scene.frame_end = int(os.environ["RENDER_FRAMES"])
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     # アニメーションレンダリング実行
-    bpy.ops.render.render(animation=True)
+    if args.shards > 1:
+        # 構築済みのシーン（エミッタの色も含む）を保存し、分割したフレーム範囲を
+        # 別々の Blender プロセスで描画する。パーティクル位置はフレームから直接求まるため、
+        # 途中のフレームからでも描画できる
+        render_animation_shards(bpy.path.abspath(scene.render.filepath), args.shards)
+    else:
+        bpy.ops.render.render(animation=True)
     print("アニメーションレンダリングが完了しました。")
 
 if __name__ == "__main__":
@@ -212,3 +360,5 @@ if __name__ == "__main__":
         main()
     except Exception as e:
         print(f"エラーが発生しました: {e}")
+        # --python-exit-code 1 付きで起動したとき（run_all.py など）に失敗を終了コードへ反映させる
+        raise
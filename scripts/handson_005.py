@@ -1,11 +1,16 @@
 import bpy
 import math
+import os
 import random
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 def assign_random_color_material(obj):
     """
@@ -207,7 +212,16 @@ def main():
 
     # レンダリング設定（カラフルな出力と高速レンダリング、動画出力のため）
     setup_scene_for_speed_and_color()
-    
+
+    # 環境変数 RENDER_FRAMES で終了フレームを短縮（確認用）
+    if os.environ.get("RENDER_FRAMES"):
+        scene.frame_end = int(os.environ["RENDER_FRAMES"])
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     # アニメーションレンダリング実行 → 動画ファイルが生成されます
     bpy.ops.render.render(animation=True)
     print("アニメーション動画のレンダリングが完了しました。")
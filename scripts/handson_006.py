@@ -1,13 +1,23 @@
 import bpy
+import bmesh
 import math
 import mathutils # type: ignore
-import random
+import numpy as np
 import os
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import enable_best_gpu  # pylint: disable=wrong-import-position
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 def setup_camera():
     """カメラを配置し、シーンのアクティブカメラに設定"""
@@ -23,52 +33,112 @@ def setup_light():
     light = bpy.context.active_object
     light.data.energy = 3.0
 
-def create_branch(origin, direction, length, thickness, depth):
+def orthonormal_basis(directions):
     """
-    再帰的に枝（シリンダー）を作成する関数
-      - origin: 枝の開始位置 (mathutils.Vector)
-      - direction: 枝の進行方向（正規化済み mathutils.Vector）
-      - length: 枝の長さ
-      - thickness: 枝の太さ（半径）
-      - depth: 再帰の深さ（depth==0 で再帰終了）
+    各 direction に直交する単位ベクトル u, v を閉形式で一括計算する（directions: (N, 3) 配列）
+    （direction の成分のうち絶対値が最小の軸との外積を使うため、長さ 0 にならない）
     """
-    if depth == 0:
-        return
+    axes = np.eye(3)[np.argmin(np.abs(directions), axis=1)]
+    u = np.cross(directions, axes)
+    u /= np.linalg.norm(u, axis=1, keepdims=True)
+    v = np.cross(directions, u)
+    return u, v
 
+def collect_branches(origin, direction, length, thickness, depth, rng=None):
+    """
+    枝（シリンダー）の配置情報を階層ごとに NumPy で一括計算する関数
+      - origin: 幹の開始位置 (x, y, z)
+      - direction: 幹の進行方向（正規化済み (x, y, z)）
+      - length: 幹の長さ
+      - thickness: 幹の太さ（半径）
+      - depth: 分岐の深さ（depth==0 で分岐なし）
+    戻り値は (origins, directions, lengths, thicknesses) の配列のタプル
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    origins = np.array([origin], dtype=np.float64)
+    directions = np.array([direction], dtype=np.float64)
+    levels = []
+    for level in range(depth):
+        count = len(origins)
+        levels.append((origins, directions, np.full(count, length), np.full(count, thickness)))
+        if level == depth - 1:
+            break
+
+        # 次の枝の開始位置は、この枝の上端
+        tips = origins + directions * length
+
+        # 分岐する枝の本数（例として2～3本）を枝ごとに決め、親のインデックスを展開
+        parents = np.repeat(np.arange(count), rng.integers(2, 4, size=count))
+        parent_dirs = directions[parents]
+        n = len(parents)
+
+        # 分岐角度（20～40度）をランダムに設定
+        angle = rng.uniform(math.radians(20), math.radians(40), n)[:, None]
+        # direction に垂直なランダムな回転軸を (u, v) 平面上で選ぶ
+        u, v = orthonormal_basis(parent_dirs)
+        theta = rng.uniform(0, 2 * math.pi, n)[:, None]
+        perp = np.cos(theta) * u + np.sin(theta) * v
+        # 軸が direction と直交するため、ロドリゲスの回転公式は 2 項だけになる
+        new_dirs = parent_dirs * np.cos(angle) + np.cross(perp, parent_dirs) * np.sin(angle)
+        new_dirs /= np.linalg.norm(new_dirs, axis=1, keepdims=True)
+
+        # 枝の長さと太さを縮小して次の階層へ
+        origins = tips[parents]
+        directions = new_dirs
+        length *= 0.7
+        thickness *= 0.7
+
+    if not levels:
+        empty = np.empty((0, 3))
+        return empty, empty, np.empty(0), np.empty(0)
+    return tuple(np.concatenate(column) for column in zip(*levels))
+
+def branch_matrices(origins, directions, lengths):
+    """
+    Z 軸方向のシリンダーを各枝の位置・向きに配置する変換行列 (N, 4, 4) を一括計算する
+    Z 軸 (0,0,1) から direction への回転は R = I + [k]x + [k]x^2 / (1 + cos) で求める
+    """
+    n = len(directions)
+    kx, ky = -directions[:, 1], directions[:, 0]   # k = Z × direction
+    c = directions[:, 2]                           # cos = Z · direction
+    skew = np.zeros((n, 3, 3))
+    skew[:, 0, 2] = ky
+    skew[:, 1, 2] = -kx
+    skew[:, 2, 0] = -ky
+    skew[:, 2, 1] = kx
+    # 真下向き（cos = -1）の場合は X 軸回りの 180 度回転
+    flipped = c < -1.0 + 1e-9
+    scale = np.where(flipped, 0.0, 1.0 / np.maximum(1.0 + c, 1e-9))
+    rotations = np.eye(3) + skew + (skew @ skew) * scale[:, None, None]
+    rotations[flipped] = np.diag((1.0, -1.0, -1.0))
+
+    matrices = np.zeros((n, 4, 4))
+    matrices[:, :3, :3] = rotations
     # 枝（シリンダー）の中心位置は、枝の底から length/2 進んだ位置とする
-    loc = origin + direction * (length / 2)
-    bpy.ops.mesh.primitive_cylinder_add(radius=thickness, depth=length, location=loc)
-    branch = bpy.context.active_object
-
-    # デフォルトのシリンダーは Z 軸方向に伸びているため、
-    # Z 軸 (0,0,1) から目的の方向への回転差を求めて回転を適用
-    rot = mathutils.Vector((0, 0, 1)).rotation_difference(direction)
-    branch.rotation_euler = rot.to_euler()
-
-    # 次の枝の開始位置は、この枝の上端
-    new_origin = origin + direction * length
-
-    if depth > 1:
-        # 分岐する枝の本数（例として2～3本）
-        num_branches = random.randint(2, 3)
-        for i in range(num_branches):
-            # 分岐角度（20～40度）をランダムに設定
-            angle = random.uniform(math.radians(20), math.radians(40))
-            # direction に垂直なランダムな回転軸を生成
-            rand_vec = mathutils.Vector((random.uniform(-1, 1),
-                                         random.uniform(-1, 1),
-                                         random.uniform(-1, 1)))
-            perp = rand_vec - rand_vec.project(direction)
-            if perp.length == 0:
-                perp = mathutils.Vector((1, 0, 0))
-            perp.normalize()
-            # 現在の direction を perp 軸回りに angle 回転
-            new_direction = direction.copy()
-            rot_matrix = mathutils.Matrix.Rotation(angle, 4, perp)
-            new_direction = rot_matrix @ new_direction
-            new_direction.normalize()
-            # 再帰呼び出し：枝の長さと太さを縮小して分岐を生成
-            create_branch(new_origin, new_direction, length * 0.7, thickness * 0.7, depth - 1)
+    matrices[:, :3, 3] = origins + directions * (lengths / 2)[:, None]
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+def create_tree(branches, name="FractalTree"):
+    """収集した枝をすべて 1 つの bmesh に書き込み、単一のメッシュオブジェクトとして生成する"""
+    origins, directions, lengths, thicknesses = branches
+    matrices = branch_matrices(origins, directions, lengths)
+
+    bm = bmesh.new()
+    for matrix, length, thickness in zip(matrices, lengths, thicknesses):
+        # bmesh に渡す時点で初めて mathutils.Matrix に変換する
+        bmesh.ops.create_cone(bm, cap_ends=True, segments=32,
+                              radius1=thickness, radius2=thickness,
+                              depth=length, matrix=mathutils.Matrix(matrix.tolist()))
+
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    tree = bpy.data.objects.new(name, mesh)
+    bpy.context.collection.objects.link(tree)
+    return tree
 
 def render_image():
     """レンダリング実行して画像を出力する関数"""
@@ -84,6 +154,18 @@ def render_image():
     scene.render.filepath = os.path.join(output_dir, "handson_006.png")
     scene.render.image_settings.file_format = 'PNG'
 
+    # 小規模シーンなのでタイル分割せず、画像全体を 1 タイルでレンダリング
+    scene.cycles.use_auto_tile = False
+    scene.cycles.tile_size = max(scene.render.resolution_x, scene.render.resolution_y)
+
+    # レンダリング中の UI 更新を止め、構築済みのシーンをそのまま評価させる
+    scene.render.use_lock_interface = True
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     # レンダリング実行（静止画）
     bpy.ops.render.render(write_still=True)
 
@@ -93,15 +175,17 @@ def main():
     setup_light()
 
     # 初期条件の設定
-    origin = mathutils.Vector((0, 0, 0))
-    direction = mathutils.Vector((0, 0, 1))  # 上方向
+    origin = (0, 0, 0)
+    direction = (0, 0, 1)  # 上方向
     initial_length = 2.0      # 初期の枝の長さ
     initial_thickness = 0.1   # 初期の枝の太さ
-    recursion_depth = 5       # 再帰の深さ
+    recursion_depth = 5       # 分岐の深さ
 
-    create_branch(origin, direction, initial_length, initial_thickness, recursion_depth)
+    branches = collect_branches(origin, direction, initial_length, initial_thickness, recursion_depth)
+    create_tree(branches)
     
     # フラクタルツリー生成後にレンダリングを実行
+    enable_best_gpu()
     render_image()
     print("フラクタルツリーの生成とレンダリングが完了しました。")
 
@@ -10,9 +10,13 @@ TARGET = None
 LOD_OBJECTS = []
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 def setup_camera_and_light():
     """カメラとサンライトを配置する"""
@@ -29,18 +33,22 @@ def duplicate_with_decimation(original, ratio):
     """
     対象オブジェクトを複製し、Decimate モディファイアを適用して
     指定の比率 (ratio) でポリゴン数を削減したオブジェクトを返す。
+    オペレーターは使わず、データブロックを直接操作して複製・適用します。
     """
-    bpy.ops.object.select_all(action='DESELECT')
-    original.select_set(True)
-    bpy.context.view_layer.objects.active = original
-    bpy.ops.object.duplicate()
-    dup_obj = bpy.context.active_object
-    dup_obj.name = f"{original.name}_LOD_{int(ratio*100)}"
-
-    # Decimate モディファイアの追加と適用
+    name = f"{original.name}_LOD_{int(ratio*100)}"
+    # 元のメッシュを共有したオブジェクトを作成（メッシュは後で差し替える）
+    dup_obj = bpy.data.objects.new(name, original.data)
+    dup_obj.matrix_world = original.matrix_world.copy()
+    bpy.context.collection.objects.link(dup_obj)
+
+    # Decimate モディファイアを追加し、評価結果を新しいメッシュとして取り出して適用
     mod = dup_obj.modifiers.new(name="Decimate", type='DECIMATE')
     mod.ratio = ratio
-    bpy.ops.object.modifier_apply(modifier=mod.name)
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    decimated = bpy.data.meshes.new_from_object(dup_obj.evaluated_get(depsgraph))
+    decimated.name = f"{name}_mesh"
+    dup_obj.modifiers.remove(mod)
+    dup_obj.data = decimated
 
     return dup_obj
 
@@ -56,42 +64,80 @@ def generate_lod_levels(target, lod_settings):
         LOD_OBJECTS.append((lod_obj, distance))
         print(f"Generated LOD: {lod_obj.name} with ratio {ratio} at threshold {distance}")
 
-def update_lod():
+def setup_lod_switch(target, lod_objects, camera):
     """
-    カメラと対象オブジェクトの距離に応じて、表示するLODモデルを切り替える。
-    ここでは、距離が小さい場合は高詳細（TARGET）、距離が大きくなるにつれて
-    低詳細のLODオブジェクトを表示し、他は非表示にします。
+    カメラと対象オブジェクトの距離に応じて、表示するLODモデルを切り替える
+    Geometry Nodes モディファイアを対象オブジェクトに追加する。
+    距離の判定は depsgraph の評価時に行われるため、カメラが動いても
+    Python 側でフレームごとに切り替え処理を行う必要はありません。
+    距離が小さい場合は高詳細（target）、距離が大きくなるにつれて
+    低詳細のLODオブジェクトのジオメトリを出力します。
     """
-    scene = bpy.context.scene
-    cam = scene.camera
-    if not cam:
-        return
-    cam_loc = cam.matrix_world.translation
-    global TARGET, LOD_OBJECTS
-    if TARGET is None:
-        return
-    target_loc = TARGET.matrix_world.translation
-    distance = (cam_loc - target_loc).length
-
-    # 統合リスト：(オブジェクト, threshold)
-    # ※高詳細モデルは閾値0.0 とする
-    lod_levels = [(TARGET, 0.0)] + LOD_OBJECTS
-    # 表示するオブジェクトは、距離 >= threshold となるうちで、最も高い閾値を持つもの
-    chosen = TARGET
-    for lod_obj, threshold in sorted(lod_levels, key=lambda x: x[1]):
-        if distance >= threshold:
-            chosen = lod_obj
-
-    # 全てのオブジェクトを非表示にし、選ばれたオブジェクトのみ表示
-    TARGET.hide_viewport = True
-    TARGET.hide_render = True
-    for lod_obj, _ in LOD_OBJECTS:
-        lod_obj.hide_viewport = True
+    levels = sorted(lod_objects, key=lambda x: x[1])
+
+    node_group = bpy.data.node_groups.new("LOD_Switch", 'GeometryNodeTree')
+    node_group.interface.new_socket("Geometry", in_out='INPUT', socket_type='NodeSocketGeometry')
+    node_group.interface.new_socket("Geometry", in_out='OUTPUT', socket_type='NodeSocketGeometry')
+    nodes = node_group.nodes
+    links = node_group.links
+
+    group_input = nodes.new('NodeGroupInput')
+    group_input.location = (-800, 0)
+    group_output = nodes.new('NodeGroupOutput')
+    group_output.location = (400, 0)
+
+    # 対象オブジェクトから見たカメラの相対位置 → 距離
+    camera_info = nodes.new('GeometryNodeObjectInfo')
+    camera_info.location = (-800, 300)
+    camera_info.transform_space = 'RELATIVE'
+    camera_info.inputs["Object"].default_value = camera
+    distance = nodes.new('ShaderNodeVectorMath')
+    distance.location = (-600, 300)
+    distance.operation = 'LENGTH'
+    links.new(camera_info.outputs["Location"], distance.inputs[0])
+
+    # 距離 >= 閾値 となる段数を数えて LOD のインデックスとする
+    index_socket = None
+    for i, (_, threshold) in enumerate(levels):
+        compare = nodes.new('FunctionNodeCompare')
+        compare.location = (-400, 300 - i * 150)
+        compare.data_type = 'FLOAT'
+        compare.operation = 'GREATER_EQUAL'
+        links.new(distance.outputs["Value"], compare.inputs[0])
+        compare.inputs[1].default_value = threshold
+        if index_socket is None:
+            index_socket = compare.outputs["Result"]
+            continue
+        add = nodes.new('ShaderNodeMath')
+        add.location = (-200, 300 - i * 150)
+        add.operation = 'ADD'
+        links.new(index_socket, add.inputs[0])
+        links.new(compare.outputs["Result"], add.inputs[1])
+        index_socket = add.outputs["Value"]
+
+    # インデックス 0 は高詳細モデル、以降は各LODオブジェクトのジオメトリ
+    switch = nodes.new('GeometryNodeIndexSwitch')
+    switch.location = (200, 0)
+    switch.data_type = 'GEOMETRY'
+    while len(switch.index_switch_items) < len(levels) + 1:
+        switch.index_switch_items.new()
+    if index_socket is not None:
+        links.new(index_socket, switch.inputs["Index"])
+    links.new(group_input.outputs["Geometry"], switch.inputs[1])
+    for i, (lod_obj, _) in enumerate(levels):
+        lod_info = nodes.new('GeometryNodeObjectInfo')
+        lod_info.location = (0, -200 - i * 200)
+        lod_info.transform_space = 'ORIGINAL'
+        lod_info.inputs["Object"].default_value = lod_obj
+        links.new(lod_info.outputs["Geometry"], switch.inputs[i + 2])
+        # LODオブジェクトはジオメトリの参照元としてのみ使い、単体では表示しない
+        lod_obj.hide_set(True)
         lod_obj.hide_render = True
-    chosen.hide_viewport = False
-    chosen.hide_render = False
+    links.new(switch.outputs[0], group_output.inputs["Geometry"])
 
-    print(f"Camera distance: {distance:.2f} | Using LOD: {chosen.name}")
+    mod = target.modifiers.new(name="LOD_Switch", type='NODES')
+    mod.node_group = node_group
+    return mod
 
 def render_image():
     """シーンをレンダリングして画像として保存する"""
@@ -110,6 +156,11 @@ def render_image():
     scene.render.filepath = os.path.join(output_dir, "handson_007.png")
     scene.render.image_settings.file_format = 'PNG'
 
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     bpy.ops.render.render(write_still=True)
     print("Rendered image saved to", scene.render.filepath)
 
@@ -129,8 +180,8 @@ def main():
     lod_settings = [(0.5, 10.0), (0.25, 20.0), (0.1, 40.0)]
     generate_lod_levels(TARGET, lod_settings)
 
-    # 更新して適切なLODモデルを表示する（カメラ位置が固定の場合）
-    update_lod()
+    # カメラ距離に応じたLOD切り替えを Geometry Nodes として設定
+    setup_lod_switch(TARGET, LOD_OBJECTS, bpy.context.scene.camera)
 
     # レンダリング実行して画像を出力
     render_image()
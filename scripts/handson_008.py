@@ -1,11 +1,17 @@
 import bpy
+import bmesh
 import math
 import os
+from itertools import product
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 def setup_camera_and_light():
     """カメラとライトを配置する"""
@@ -21,29 +27,46 @@ def setup_camera_and_light():
     light.data.energy = 3.0
 
 def create_base_object():
-    """基底オブジェクトとして立方体を作成する"""
-    bpy.ops.mesh.primitive_cube_add(location=(0, 0, 0))
-    obj = bpy.context.active_object
-    obj.name = "BaseCube"
+    """基底オブジェクトとして立方体を作成する（bmesh で直接メッシュを構築）"""
+    mesh = bpy.data.meshes.new("BaseCube")
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=2.0)
+    bm.to_mesh(mesh)
+    bm.free()
+
+    obj = bpy.data.objects.new("BaseCube", mesh)
+    obj.location = (0, 0, 0)
+    bpy.context.collection.objects.link(obj)
     return obj
 
-def add_array_modifier(obj, modifier_name, count, offset, axis=(1, 0, 0)):
+def create_instance_grid(base_obj, count_x, count_y, offset):
     """
-    指定オブジェクトに Array モディファイアを追加する関数
-      - obj: 対象オブジェクト
-      - modifier_name: モディファイアの名前
-      - count: 複製数
-      - offset: 複製間のオフセット値（倍率）
-      - axis: 複製方向（デフォルトは X 軸方向）
+    基底オブジェクトのメッシュを共有するリンク複製を格子状に配置する関数
+    （Array モディファイアと違いジオメトリを複製しないため、
+      レンダリング時は 1 つのメッシュの BVH を全インスタンスで再利用できる）
+      - base_obj: 基底オブジェクト（格子の 1 個目として使用）
+      - count_x: X 軸方向の複製数
+      - count_y: Y 軸方向の複製数
+      - offset: 複製間のオフセット値（オブジェクトの寸法に対する倍率）
     """
-    mod = obj.modifiers.new(name=modifier_name, type='ARRAY')
-    mod.count = count
-    mod.use_relative_offset = True
-    # relative_offset_displace は各軸ごとに倍率を指定する（デフォルトは X 軸に 1.0）
-    mod.relative_offset_displace[0] = offset * axis[0]
-    mod.relative_offset_displace[1] = offset * axis[1]
-    mod.relative_offset_displace[2] = offset * axis[2]
-    return mod
+    # Array モディファイアの相対オフセットと同様に、寸法を基準に間隔を決める
+    # （dimensions を読むと depsgraph の評価が走るため、メッシュの頂点から直接求める）
+    xs = [v.co.x for v in base_obj.data.vertices]
+    ys = [v.co.y for v in base_obj.data.vertices]
+    step_x = (max(xs) - min(xs)) * base_obj.scale.x * offset
+    step_y = (max(ys) - min(ys)) * base_obj.scale.y * offset
+    collection = bpy.context.collection
+    instances = [base_obj]
+    for x, y in product(range(count_x), range(count_y)):
+        if x == 0 and y == 0:
+            continue
+        inst = bpy.data.objects.new(f"{base_obj.name}_{x}_{y}", base_obj.data)
+        inst.location = (base_obj.location.x + step_x * x,
+                         base_obj.location.y + step_y * y,
+                         base_obj.location.z)
+        collection.objects.link(inst)
+        instances.append(inst)
+    return instances
 
 def render_image():
     """シーンをレンダリングして画像として保存する"""
@@ -62,6 +85,14 @@ def render_image():
     scene.render.filepath = os.path.join(output_dir, "handson_008.png")
     scene.render.image_settings.file_format = 'PNG'
 
+    # レンダリング中の UI 更新を止め、構築済みのシーンをそのまま評価させる
+    scene.render.use_lock_interface = True
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     bpy.ops.render.render(write_still=True)
     print("Rendered image saved to", scene.render.filepath)
 
@@ -72,14 +103,8 @@ def main():
     # 基底オブジェクト（立方体）の作成
     base_obj = create_base_object()
     
-    # 1. X 軸方向に 8 個の複製（オフセット 1.5）を生成
-    add_array_modifier(base_obj, modifier_name="Array_X", count=8, offset=1.5, axis=(1, 0, 0))
-    
-    # 2. Y 軸方向にも複製するため、2 番目の Array モディファイアを追加
-    #    ※2 番目のモディファイアは既存の X 軸配列に対して重ね合わせる形になる
-    add_array_modifier(base_obj, modifier_name="Array_Y", count=4, offset=1.5, axis=(0, 1, 0))
-    
-    # 必要に応じて、Z 軸方向への配列なども追加可能です
+    # X 軸方向に 8 個 × Y 軸方向に 4 個（オフセット 1.5）のリンク複製を生成
+    create_instance_grid(base_obj, count_x=8, count_y=4, offset=1.5)
 
     # 配列生成結果を確認するためレンダリング実行
     render_image()
@@ -1,11 +1,21 @@
 import bpy
 import math
 import os
+import numpy as np
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import enable_best_gpu  # pylint: disable=wrong-import-position
 
 def clear_scene():
-    """シーン内の全オブジェクトを削除"""
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    """シーン内の全オブジェクトを削除（オペレーターを使わず bpy.data から直接削除）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for mat in list(bpy.data.materials):
+        bpy.data.materials.remove(mat)
 
 def setup_camera_and_light():
     """カメラとライトを配置する"""
@@ -21,29 +31,76 @@ def setup_camera_and_light():
     light = bpy.context.active_object
     light.data.energy = 3.0
 
+def value_noise(x, y, seed=0):
+    """
+    格子点ごとのハッシュ値を滑らかに補間する 2D バリューノイズ（NumPy で一括計算）
+    戻り値はおおよそ -1 ～ 1 の範囲
+    """
+    xi = np.floor(x)
+    yi = np.floor(y)
+    xf = x - xi
+    yf = y - yi
+    # smoothstep による補間係数
+    u = xf * xf * (3.0 - 2.0 * xf)
+    v = yf * yf * (3.0 - 2.0 * yf)
+    xi = xi.astype(np.int64).astype(np.uint64)
+    yi = yi.astype(np.int64).astype(np.uint64)
+
+    def lattice(ix, iy):
+        # 整数ハッシュで格子点の値を決める（-1 ～ 1）
+        h = (ix * np.uint64(374761393) + iy * np.uint64(668265263)
+             + np.uint64(seed) * np.uint64(144269)) & np.uint64(0xFFFFFFFF)
+        h = ((h ^ (h >> np.uint64(13))) * np.uint64(1274126177)) & np.uint64(0xFFFFFFFF)
+        h = h ^ (h >> np.uint64(16))
+        return h.astype(np.float64) / 0xFFFFFFFF * 2.0 - 1.0
+
+    one = np.uint64(1)
+    n00 = lattice(xi, yi)
+    n10 = lattice(xi + one, yi)
+    n01 = lattice(xi, yi + one)
+    n11 = lattice(xi + one, yi + one)
+    nx0 = n00 + (n10 - n00) * u
+    nx1 = n01 + (n11 - n01) * u
+    return nx0 + (nx1 - nx0) * v
+
+def fbm(x, y, octaves=4, lacunarity=2.0, gain=0.5):
+    """バリューノイズを周波数を上げながら重ね合わせる fBm（Musgrave FBM 相当）"""
+    total = np.zeros_like(x)
+    amplitude = 1.0
+    frequency = 1.0
+    for octave in range(octaves):
+        total += amplitude * value_noise(x * frequency, y * frequency, seed=octave)
+        amplitude *= gain
+        frequency *= lacunarity
+    return total
+
 def create_procedural_terrain():
     """
     プロシージャルな地形を生成する
       - primitive_grid_add() を利用してグリッド（地形のベース）を作成
-      - Displace モディファイアと Musgrave テクスチャで高さ変動を与える
+      - NumPy で計算した fBm の高さを foreach_set で一度だけ頂点に書き込む
       - 簡単なマテリアルを設定
     """
     # x, y方向に 256 分割された 10 単位サイズのグリッドを作成
+    # （最も細かいオクターブの格子 1 マスに 6 頂点ほど入る密度で高さを直接サンプリングし、
+    #   粗いグリッドに焼いてから細分化したときのように山の形が崩れたり均されたりしないようにする）
     bpy.ops.mesh.primitive_grid_add(x_subdivisions=256, y_subdivisions=256, size=10, location=(0, 0, 0))
     terrain = bpy.context.active_object
     terrain.name = "ProceduralTerrain"
 
-    # Displace モディファイアを追加
-    disp_mod = terrain.modifiers.new(name="Displace", type='DISPLACE')
-    # Musgrave テクスチャの生成
-    tex = bpy.data.textures.new("TerrainTexture", type='MUSGRAVE')
-    tex.musgrave_type = 'FBM'
-    tex.noise_scale = 2.0   # ノイズの大きさ
-    tex.octaves = 4         # 細かさ
-    tex.lacunarity = 2.0    # lacunarity（繰り返しの間隔）
-    # Blender 4.0 では、dimension または musgrave_dimension 属性は存在しないので設定しない
-    disp_mod.texture = tex
-    disp_mod.strength = 2.0  # 変位の強さ
+    # 頂点座標を一括で取得し、fBm による高さを加えて一括で書き戻す
+    # （Displace モディファイアのようにレンダリングのたびに評価されない）
+    mesh = terrain.data
+    coords = np.empty(len(mesh.vertices) * 3, dtype=np.float32)
+    mesh.vertices.foreach_get("co", coords)
+    coords = coords.reshape(-1, 3)
+    noise_scale = 2.0   # ノイズの大きさ
+    strength = 2.0      # 変位の強さ
+    heights = fbm(coords[:, 0] / noise_scale, coords[:, 1] / noise_scale,
+                  octaves=4, lacunarity=2.0)
+    coords[:, 2] += (heights * 0.5 * strength).astype(np.float32)
+    mesh.vertices.foreach_set("co", coords.ravel())
+    mesh.update()
 
     # シンプルな地形用マテリアルを追加
     mat = bpy.data.materials.new("TerrainMaterial")
@@ -73,6 +130,15 @@ def render_image():
     scene.render.filepath = os.path.join(output_dir, "handson_009.png")
     scene.render.image_settings.file_format = 'PNG'
 
+    # 小規模シーンなのでタイル分割せず、画像全体を 1 タイルでレンダリング
+    scene.cycles.use_auto_tile = False
+    scene.cycles.tile_size = max(scene.render.resolution_x, scene.render.resolution_y)
+
+    # 環境変数 RENDER=0 の場合はシーン構築の確認のみ行い、レンダリングを省略
+    if os.environ.get("RENDER", "1") != "1":
+        print("RENDER=0 のためレンダリングを省略しました。")
+        return
+
     bpy.ops.render.render(write_still=True)
     print("Rendered image saved to", scene.render.filepath)
 
@@ -80,6 +146,7 @@ def main():
     clear_scene()
     setup_camera_and_light()
     create_procedural_terrain()
+    enable_best_gpu()
     render_image()
     print("プロシージャルな地形生成が完了しました。")
 
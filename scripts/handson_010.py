@@ -1,6 +1,47 @@
 import bpy
+import hashlib
 import os
 import math
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, ensure_output, parse_gpu_index, select_engine  # pylint: disable=wrong-import-position
+
+# "preview" では解像度とサンプル数を落として確認用に素早くレンダリングする（"final" で本番品質）
+QUALITY = os.environ.get("BLENDER_QUALITY", "preview")
+
+# 一辺 2 の立方体（primitive_cube_add の既定サイズ）の頂点と面
+CUBE_VERTS = (
+    (-1, -1, -1), (-1, -1, 1), (-1, 1, -1), (-1, 1, 1),
+    (1, -1, -1), (1, -1, 1), (1, 1, -1), (1, 1, 1),
+)
+CUBE_FACES = (
+    (0, 1, 3, 2), (2, 3, 7, 6), (6, 7, 5, 4),
+    (4, 5, 1, 0), (2, 6, 4, 0), (7, 3, 1, 5),
+)
+
+# 一辺 2 の平面（XY 平面上、法線は +Z）の頂点と面
+PLANE_VERTS = ((-1, -1, 0), (1, -1, 0), (-1, 1, 0), (1, 1, 0))
+PLANE_FACES = ((0, 1, 3, 2),)
+
+def create_mesh_object(name, verts, faces, size=2.0, location=(0, 0, 0), rotation=(0, 0, 0)):
+    """
+    頂点と面から直接メッシュを構築してオブジェクトを作成し、シーンにリンクする
+    （bpy.ops のプリミティブ追加と違い、呼び出しごとの depsgraph 更新や Undo 登録が発生しない）
+    verts は一辺 2 の形状を想定し、size に合わせて拡大縮小する
+    """
+    scale = size / 2.0
+    mesh = bpy.data.meshes.new(name)
+    mesh.from_pydata([(x * scale, y * scale, z * scale) for x, y, z in verts], [], faces)
+    mesh.update()
+
+    obj = bpy.data.objects.new(name, mesh)
+    obj.location = location
+    obj.rotation_euler = rotation
+    bpy.context.scene.collection.objects.link(obj)
+    return obj
 
 def create_comparison_scene():
     """
@@ -9,61 +50,66 @@ def create_comparison_scene():
     - 床を追加
     - キューブを回転させて陰影を確認しやすく
     """
-    # 既存のメッシュオブジェクトを削除
-    for obj in bpy.data.objects:
-        if obj.type == 'MESH':
-            bpy.data.objects.remove(obj, do_unlink=True)
+    # 既存のメッシュオブジェクトを一括削除
+    bpy.data.batch_remove(ids=[obj for obj in bpy.data.objects if obj.type == 'MESH'])
     
     # 床を作成
-    bpy.ops.mesh.primitive_plane_add(size=10, location=(0, 0, -1))
-    floor = bpy.context.active_object
-    floor.name = "Floor"
+    floor = create_mesh_object("Floor", PLANE_VERTS, PLANE_FACES, size=10, location=(0, 0, -1))
     
     # 通常マテリアルのキューブを作成
-    bpy.ops.mesh.primitive_cube_add(location=(-2, 0, 0))
-    normal_cube = bpy.context.active_object
-    normal_cube.name = "NormalCube"
-    normal_cube.rotation_euler = (math.radians(15), math.radians(45), 0)
+    normal_cube = create_mesh_object(
+        "NormalCube", CUBE_VERTS, CUBE_FACES, location=(-2, 0, 0),
+        rotation=(math.radians(15), math.radians(45), 0)
+    )
     
     # 発光マテリアルのキューブを作成
-    bpy.ops.mesh.primitive_cube_add(location=(2, 0, 0))
-    emission_cube = bpy.context.active_object
-    emission_cube.name = "EmissionCube"
-    emission_cube.rotation_euler = (math.radians(15), math.radians(45), 0)
+    emission_cube = create_mesh_object(
+        "EmissionCube", CUBE_VERTS, CUBE_FACES, location=(2, 0, 0),
+        rotation=(math.radians(15), math.radians(45), 0)
+    )
     
     return floor, normal_cube, emission_cube
 
 def create_floor_material():
     """床用のマテリアルを作成"""
-    mat = bpy.data.materials.get("FloorMaterial")
-    if mat is None:
-        mat = bpy.data.materials.new("FloorMaterial")
-    
-    mat.use_nodes = True
-    mat.node_tree.nodes.clear()
-    
-    # プリンシプルBSDFノードを追加
-    principled = mat.node_tree.nodes.new("ShaderNodeBsdfPrincipled")
-    principled.location = (0, 0)
-    principled.inputs["Base Color"].default_value = (0.2, 0.2, 0.2, 1)  # 暗めの灰色
-    principled.inputs["Roughness"].default_value = 0.7  # やや粗い表面
-    
-    output = mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
-    output.location = (300, 0)
-    
-    mat.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
-    
-    return mat
+    return principled_material("FloorMaterial", {
+        "Base Color": (0.2, 0.2, 0.2, 1),  # 暗めの灰色
+        "Roughness": 0.7,  # やや粗い表面
+    })
 
 def setup_scene_for_render():
     """
     レンダリング用のシーン設定を行う
     """
     # レンダリング設定
-    bpy.context.scene.render.engine = 'CYCLES'
-    bpy.context.scene.cycles.samples = 128
     bpy.context.scene.render.resolution_x = 1200
     bpy.context.scene.render.resolution_y = 800
+    if QUALITY == "preview":
+        # 縦横比を保ったまま各辺を半分（画素数 1/4）にする
+        bpy.context.scene.render.resolution_percentage = 50
+
+    if select_engine(bpy.context.scene):
+        bpy.context.scene.cycles.samples = 16 if QUALITY == "preview" else 32  # 少ないサンプル数をデノイザーで補う
+
+        # GPU（OptiX/CUDA/HIP/Metal/oneAPI）でレンダリングし、適応サンプリングで早期終了させる
+        if enable_best_gpu(parse_gpu_index()):
+            bpy.context.scene.cycles.tile_size = 2048
+        bpy.context.scene.cycles.use_adaptive_sampling = True
+        bpy.context.scene.cycles.adaptive_threshold = 0.01
+        bpy.context.scene.cycles.use_denoising = True
+        bpy.context.scene.cycles.denoiser = "OPENIMAGEDENOISE"
+        bpy.context.scene.cycles.denoising_input_passes = "RGB_ALBEDO_NORMAL"
+        bpy.context.scene.cycles.denoising_use_gpu = True
+
+        # 単純なシーンなのでバウンス数を抑え、1 パスあたりのレイ数を減らす
+        bpy.context.scene.cycles.max_bounces = 4
+        bpy.context.scene.cycles.diffuse_bounces = 2
+        bpy.context.scene.cycles.glossy_bounces = 2
+        bpy.context.scene.cycles.transmission_bounces = 2
+        bpy.context.scene.cycles.volume_bounces = 0
+        bpy.context.scene.cycles.caustics_reflective = False
+        bpy.context.scene.cycles.caustics_refractive = False
+        bpy.context.scene.cycles.light_sampling_threshold = 0.01
     
     # ワールドの設定（暗めの環境）
     world = bpy.context.scene.world
@@ -75,12 +121,12 @@ def setup_scene_for_render():
     world.node_tree.nodes["Background"].inputs[1].default_value = 1.0
     
     # カメラの設定
-    if 'Camera' not in bpy.data.objects:
+    cam = bpy.data.objects.get('Camera')
+    if cam is None:
         cam_data = bpy.data.cameras.new(name='Camera')
-        cam_obj = bpy.data.objects.new('Camera', cam_data)
-        bpy.context.scene.collection.objects.link(cam_obj)
+        cam = bpy.data.objects.new('Camera', cam_data)
+        bpy.context.scene.collection.objects.link(cam)
     
-    cam = bpy.data.objects['Camera']
     cam.location = (0, -8, 5)
     cam.rotation_euler = (math.radians(55), 0, 0)
     
@@ -100,12 +146,23 @@ def setup_scene_for_render():
     
     bpy.context.scene.camera = cam
 
+# CustomEmissionGroup のインターフェース定義（変更するとノードグループが再構築される）
+CUSTOM_GROUP_SCHEMA = (
+    ("Input Color", 'INPUT', 'NodeSocketColor', (1.0, 0.5, 0.0, 1.0)),
+    ("Strength", 'INPUT', 'NodeSocketFloat', 50.0),
+    ("Shader", 'OUTPUT', 'NodeSocketShader', None),
+)
+CUSTOM_GROUP_SCHEMA_HASH = hashlib.md5(repr(CUSTOM_GROUP_SCHEMA).encode()).hexdigest()
+
 def create_custom_node_group():
-    """前のコードと同じ"""
+    """前のコードと同じ（定義が変わっていなければ既存のノードグループをそのまま使う）"""
     node_group = bpy.data.node_groups.get("CustomEmissionGroup")
     if node_group is None:
         node_group = bpy.data.node_groups.new("CustomEmissionGroup", 'ShaderNodeTree')
         print("新規ノードグループを作成: CustomEmissionGroup")
+    elif node_group.get("_schema_hash") == CUSTOM_GROUP_SCHEMA_HASH:
+        print("既存のノードグループを再利用: CustomEmissionGroup")
+        return node_group
     else:
         node_group.nodes.clear()
         node_group.links.clear()
@@ -113,26 +170,15 @@ def create_custom_node_group():
     
     node_group.interface.clear()
     
-    color_input = node_group.interface.new_socket(
-        name="Input Color",
-        in_out='INPUT',
-        socket_type='NodeSocketColor'
-    )
-    color_input.default_value = (1.0, 0.5, 0.0, 1.0)
-    
-    strength_input = node_group.interface.new_socket(
-        name="Strength",
-        in_out='INPUT',
-        socket_type='NodeSocketFloat'
-    )
-    strength_input.default_value = 50.0
-    strength_input.min_value = 0.0
-    
-    node_group.interface.new_socket(
-        name="Shader",
-        in_out='OUTPUT',
-        socket_type='NodeSocketShader'
-    )
+    for name, in_out, socket_type, default_value in CUSTOM_GROUP_SCHEMA:
+        socket = node_group.interface.new_socket(
+            name=name,
+            in_out=in_out,
+            socket_type=socket_type
+        )
+        if default_value is not None:
+            socket.default_value = default_value
+    node_group.interface.items_tree["Strength"].min_value = 0.0
     
     group_input = node_group.nodes.new("NodeGroupInput")
     group_input.location = (-300, 0)
@@ -147,10 +193,11 @@ def create_custom_node_group():
     node_group.links.new(group_input.outputs["Strength"], emission_node.inputs["Strength"])
     node_group.links.new(emission_node.outputs["Emission"], group_output.inputs["Shader"])
     
+    node_group["_schema_hash"] = CUSTOM_GROUP_SCHEMA_HASH
     return node_group
 
 def create_material_with_custom_group(node_group):
-    """前のコードと同じ"""
+    """前のコードと同じ（既にノードグループを参照していれば入力値だけを更新する）"""
     mat = bpy.data.materials.get("CustomEmissionMaterial")
     if mat is None:
         mat = bpy.data.materials.new("CustomEmissionMaterial")
@@ -159,50 +206,32 @@ def create_material_with_custom_group(node_group):
         print("既存のマテリアルを更新: CustomEmissionMaterial")
     
     mat.use_nodes = True
-    mat.node_tree.nodes.clear()
-    
-    output_node = mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
-    output_node.location = (400, 0)
-    
-    group_node = mat.node_tree.nodes.new("ShaderNodeGroup")
-    group_node.node_tree = node_group
-    group_node.location = (0, 0)
+    group_node = mat.node_tree.nodes.get("CustomGroup")
+    if group_node is None or group_node.node_tree != node_group:
+        mat.node_tree.nodes.clear()
+        
+        output_node = mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
+        output_node.location = (400, 0)
+        
+        group_node = mat.node_tree.nodes.new("ShaderNodeGroup")
+        group_node.name = "CustomGroup"
+        group_node.node_tree = node_group
+        group_node.location = (0, 0)
+        
+        mat.node_tree.links.new(group_node.outputs["Shader"], output_node.inputs["Surface"])
     
     group_node.inputs["Input Color"].default_value = (1.0, 0.5, 0.0, 1.0)
     group_node.inputs["Strength"].default_value = 5.0  # 発光強度を下げる
     
-    mat.node_tree.links.new(group_node.outputs["Shader"], output_node.inputs["Surface"])
-    
     return mat
 
-def ensure_output_directory():
-    """出力ディレクトリの確認"""
-    output_dir = os.path.abspath("output")
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-    return output_dir
-
 def create_normal_material():
     """通常の比較用マテリアルを作成"""
-    mat = bpy.data.materials.get("NormalMaterial")
-    if mat is None:
-        mat = bpy.data.materials.new("NormalMaterial")
-    
-    mat.use_nodes = True
-    mat.node_tree.nodes.clear()
-    
-    principled = mat.node_tree.nodes.new("ShaderNodeBsdfPrincipled")
-    principled.location = (0, 0)
-    principled.inputs["Base Color"].default_value = (1.0, 0.5, 0.0, 1.0)  # オレンジ
-    principled.inputs["Metallic"].default_value = 0.0
-    principled.inputs["Roughness"].default_value = 0.5
-    
-    output = mat.node_tree.nodes.new("ShaderNodeOutputMaterial")
-    output.location = (300, 0)
-    
-    mat.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
-    
-    return mat
+    return principled_material("NormalMaterial", {
+        "Base Color": (1.0, 0.5, 0.0, 1.0),  # オレンジ
+        "Metallic": 0.0,
+        "Roughness": 0.5,
+    })
 
 def main():
     """メイン実行関数"""
@@ -234,7 +263,7 @@ def main():
         emission_cube.data.materials.append(emission_material)
         
         # レンダリングの実行と保存
-        output_dir = ensure_output_directory()
+        output_dir = ensure_output()
         output_path = os.path.join(output_dir, "handson_010.png")
         bpy.context.scene.render.filepath = output_path
         print(f"\nレンダリング中... 出力先: {output_path}")
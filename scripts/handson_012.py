@@ -1,19 +1,37 @@
 import bpy
 import math
-import random
+import numpy as np
+import os
+import sys
+from mathutils import Euler
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, ensure_output, parse_gpu_index, select_engine  # pylint: disable=wrong-import-position
+
+# 度からラジアンへの変換係数（math.radians を軸ごとに呼ばない）
+DEG2RAD = math.pi / 180
+
+# ポップアートテキストの全レイヤー共通の回転（度）。X 軸まわりに起こして正面を向くように
+LAYER_ROTATION = (90, 0, 0)
+
+# "preview" では解像度とサンプル数を落として確認用に素早くレンダリングする（"final" で本番品質）
+QUALITY = os.environ.get("BLENDER_QUALITY", "preview")
 
 def clear_scene():
-    """シーンをクリアする"""
-    for obj in bpy.data.objects:
-        bpy.data.objects.remove(obj, do_unlink=True)
-    for mat in bpy.data.materials:
-        bpy.data.materials.remove(mat, do_unlink=True)
+    """シーンをクリアする（オブジェクトを一括削除）"""
+    # テキストマテリアルは色から決まる名前で再利用するので削除しない
+    bpy.data.batch_remove(ids=list(bpy.data.objects))
 
 def create_3d_text_layer(text, location, color, size=1.0, extrude=0.2, bevel=0.02, rotation=(0, 0, 0)):
     """3Dテキストレイヤーを作成する（改良版）"""
-    bpy.ops.object.text_add(location=location)
-    text_obj = bpy.context.active_object
-    text_obj.data.body = text
+    # テキストカーブとオブジェクトをデータ API で直接作成
+    text_curve = bpy.data.curves.new(name="Text", type='FONT')
+    text_curve.body = text
+    text_obj = bpy.data.objects.new("Text", text_curve)
+    text_obj.location = location
+    bpy.context.scene.collection.objects.link(text_obj)
     
     # テキストの基本設定
     text_obj.data.size = size
@@ -26,11 +44,7 @@ def create_3d_text_layer(text, location, color, size=1.0, extrude=0.2, bevel=0.0
     text_obj.data.align_y = 'CENTER'
     
     # 回転を適用
-    text_obj.rotation_euler = (
-        math.radians(rotation[0]),
-        math.radians(rotation[1]),
-        math.radians(rotation[2])
-    )
+    text_obj.rotation_euler = Euler((rotation[0] * DEG2RAD, rotation[1] * DEG2RAD, rotation[2] * DEG2RAD), 'XYZ')
     
     # マテリアルを作成して割り当て
     mat = create_text_material(color)
@@ -39,33 +53,23 @@ def create_3d_text_layer(text, location, color, size=1.0, extrude=0.2, bevel=0.0
     return text_obj
 
 def create_text_material(color):
-    """改良版テキストマテリアル作成"""
-    mat = bpy.data.materials.new(name=f"TextMaterial_{random.randint(0,1000)}")
-    mat.use_nodes = True
-    nodes = mat.node_tree.nodes
-    nodes.clear()
-    
-    # プリンシプルBSDFノード
-    principled = nodes.new("ShaderNodeBsdfPrincipled")
-    principled.inputs["Base Color"].default_value = (*color, 1)
-    principled.inputs["Metallic"].default_value = 0.3
-    principled.inputs["Roughness"].default_value = 0.2
-    principled.inputs["Specular IOR Level"].default_value = 0.5
-    # Clearcoat関連のパラメータは削除
-    
-    # 出力ノード
-    output = nodes.new("ShaderNodeOutputMaterial")
-    
-    # ノードを接続
-    mat.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
-    
-    return mat
+    """改良版テキストマテリアル作成（共通テンプレートを複製して色だけを変更）"""
+    # 色から決まる名前にして、同じ色のマテリアルが既にあればそれを再利用する
+    name = "TextMaterial_" + "".join(f"{round(c * 255):02x}" for c in color)
+    return principled_material(name, {
+        "Base Color": (*color, 1),
+        "Metallic": 0.3,
+        "Roughness": 0.2,
+        "Specular IOR Level": 0.5,
+    })
 
 def setup_camera():
     """カメラセットアップ（正面からの視点）"""
-    bpy.ops.object.camera_add(location=(0, -4, 0))
-    camera = bpy.context.active_object
-    camera.rotation_euler = (math.radians(0), 0, 0)
+    cam_data = bpy.data.cameras.new(name="Camera")
+    camera = bpy.data.objects.new("Camera", cam_data)
+    bpy.context.scene.collection.objects.link(camera)
+    camera.location = (0, -4, 0)
+    camera.rotation_euler = (0, 0, 0)
     
     # カメラの視野角を調整（より広い視野に）
     camera.data.lens = 35
@@ -81,42 +85,68 @@ def setup_camera():
     track.up_axis = 'UP_Y'
     
     bpy.context.scene.camera = camera
+    return camera
+
+def create_area_light(name, location, energy, size):
+    """エリアライトをデータ API で直接作成し、シーンにリンクする"""
+    light_data = bpy.data.lights.new(name=name, type='AREA')
+    light_data.energy = energy
+    light_data.size = size
+
+    light_obj = bpy.data.objects.new(name, light_data)
+    light_obj.location = location
+    bpy.context.scene.collection.objects.link(light_obj)
+    return light_obj
 
 def setup_lighting():
     """改良版ライティングセットアップ"""
     # フロントライト
-    bpy.ops.object.light_add(type='AREA', location=(0, -3, 1))
-    front_light = bpy.context.active_object
-    front_light.data.energy = 800
-    front_light.data.size = 5
+    front_light = create_area_light("FrontLight", (0, -3, 1), energy=800, size=5)
     
     # 上部ライト
-    bpy.ops.object.light_add(type='AREA', location=(0, -1, 3))
-    top_light = bpy.context.active_object
-    top_light.data.energy = 500
-    top_light.data.size = 3
+    top_light = create_area_light("TopLight", (0, -1, 3), energy=500, size=3)
     
     # サイドライト（左）
-    bpy.ops.object.light_add(type='AREA', location=(-2, -2, 1))
-    left_light = bpy.context.active_object
-    left_light.data.energy = 300
-    left_light.data.size = 2
+    left_light = create_area_light("LeftLight", (-2, -2, 1), energy=300, size=2)
     
     # サイドライト（右）
-    bpy.ops.object.light_add(type='AREA', location=(2, -2, 1))
-    right_light = bpy.context.active_object
-    right_light.data.energy = 300
-    right_light.data.size = 2
+    right_light = create_area_light("RightLight", (2, -2, 1), energy=300, size=2)
+    
+    # 呼び出し側が名前で引き直さずに調整できるよう参照を返す
+    return {"front": front_light, "top": top_light, "left": left_light, "right": right_light}
 
 def setup_render():
     """レンダリング設定（高品質）"""
     scene = bpy.context.scene
-    scene.render.engine = 'CYCLES'
-    scene.cycles.samples = 256
-    scene.cycles.use_denoising = True
     scene.render.resolution_x = 1920
     scene.render.resolution_y = 1080
+    if QUALITY == "preview":
+        # 縦横比を保ったまま各辺を半分（画素数 1/4）にする
+        scene.render.resolution_percentage = 50
     scene.render.film_transparent = True
+
+    if select_engine(scene):
+        scene.cycles.samples = 16 if QUALITY == "preview" else 32  # 少ないサンプル数をデノイザーで補う
+        scene.cycles.use_denoising = True
+        scene.cycles.denoiser = "OPENIMAGEDENOISE"
+        scene.cycles.denoising_input_passes = "RGB_ALBEDO_NORMAL"
+        scene.cycles.denoising_use_gpu = True
+
+        # GPU（OptiX/CUDA/HIP/Metal/oneAPI）でレンダリングし、適応サンプリングで早期終了させる
+        if enable_best_gpu(parse_gpu_index()):
+            scene.cycles.tile_size = 2048
+        scene.cycles.use_adaptive_sampling = True
+        scene.cycles.adaptive_threshold = 0.01
+
+        # 単純なシーンなのでバウンス数を抑え、1 パスあたりのレイ数を減らす
+        scene.cycles.max_bounces = 4
+        scene.cycles.diffuse_bounces = 2
+        scene.cycles.glossy_bounces = 2
+        scene.cycles.transmission_bounces = 2
+        scene.cycles.volume_bounces = 0
+        scene.cycles.caustics_reflective = False
+        scene.cycles.caustics_refractive = False
+        scene.cycles.light_sampling_threshold = 0.01
     
     # ワールド設定
     world = scene.world
@@ -136,34 +166,23 @@ def create_layered_pop_text(text="POP!", base_location=(0, 0, 0)):
         (0.9, 0.8, 0.3),  # パステルイエロー
     ]
     
+    # 各レイヤーの位置・厚み・面取りを NumPy でまとめて計算
+    i = np.arange(len(colors), dtype=np.float64)
+    offsets = np.stack([i * 0.05, i * -0.05, i * 0.1], axis=1)
+    locations = np.asarray(base_location, dtype=np.float64) + offsets
+    extrudes = 0.2 - i * 0.02  # レイヤーごとに少しずつ薄く
+    bevels = 0.02 - i * 0.002  # レイヤーごとに面取りも調整
+    
     text_objects = []
-    for i, color in enumerate(colors):
-        # 各レイヤーの位置とローテーションを計算
-        z_offset = i * 0.1
-        x_offset = i * 0.05
-        y_offset = i * -0.05
-        
-        location = (
-            base_location[0] + x_offset,
-            base_location[1] + y_offset,
-            base_location[2] + z_offset
-        )
-        
-        # 各レイヤーに微妙な回転を加える
-        rotation = (90, 0, 0)  # 回転を0に設定して正面を向くように
-        
-        # テキストの厚みと面取りを調整
-        extrude = 0.2 - (i * 0.02)  # レイヤーごとに少しずつ薄く
-        bevel = 0.02 - (i * 0.002)  # レイヤーごとに面取りも調整
-        
+    for k, color in enumerate(colors):
         text_obj = create_3d_text_layer(
             text,
-            location,
+            tuple(locations[k].tolist()),
             color,
             size=1.2,
-            extrude=extrude,
-            bevel=bevel,
-            rotation=rotation
+            extrude=float(extrudes[k]),
+            bevel=float(bevels[k]),
+            rotation=LAYER_ROTATION
         )
         text_objects.append(text_obj)
     
@@ -186,11 +205,8 @@ def main():
         setup_render()
         
         # 出力先ディレクトリの作成
-        import os
-        output_dir = os.path.abspath("output")
-        if not os.path.exists(output_dir):
-            os.makedirs(output_dir)
-            
+        output_dir = ensure_output()
+        
         # レンダリング実行と保存
         output_path = os.path.join(output_dir, "handson_012.png")
         bpy.context.scene.render.filepath = output_path
@@ -1,48 +1,60 @@
 import bpy
 import math
 import os
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, ensure_output, parse_gpu_index, select_engine  # pylint: disable=wrong-import-position
+
+# 一辺 2 の立方体（primitive_cube_add の既定サイズ）の頂点と面
+CUBE_VERTS = (
+    (-1, -1, -1), (-1, -1, 1), (-1, 1, -1), (-1, 1, 1),
+    (1, -1, -1), (1, -1, 1), (1, 1, -1), (1, 1, 1),
+)
+CUBE_FACES = (
+    (0, 1, 3, 2), (2, 3, 7, 6), (6, 7, 5, 4),
+    (4, 5, 1, 0), (2, 6, 4, 0), (7, 3, 1, 5),
+)
 
 def clear_scene():
-    """シーンをクリアする"""
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete()
-    
-    for material in bpy.data.materials:
-        bpy.data.materials.remove(material)
-    
-    for obj in bpy.data.objects:
-        if obj.type in ['CAMERA', 'LIGHT']:
-            bpy.data.objects.remove(obj, do_unlink=True)
-
-def create_material(alpha=0.1, name="CubeMaterial"):
-    """透明なマテリアルを作成"""
-    mat = bpy.data.materials.new(name=name)
-    mat.use_nodes = True
-    nodes = mat.node_tree.nodes
-    nodes.clear()
-    
-    # プリンシプルBSDFを追加
-    principled = nodes.new("ShaderNodeBsdfPrincipled")
-    principled.inputs["Base Color"].default_value = (0.8, 0.8, 0.8, 0.1)
-    principled.inputs["Metallic"].default_value = 0.1
-    principled.inputs["Roughness"].default_value = 0.3
-    principled.inputs["Alpha"].default_value = alpha
-    
-    # マテリアル出力を追加
-    output = nodes.new("ShaderNodeOutputMaterial")
-    mat.node_tree.links.new(principled.outputs["BSDF"], output.inputs["Surface"])
+    """シーンをクリアする（オブジェクトとマテリアルを一括削除）"""
+    bpy.data.batch_remove(ids=list(bpy.data.objects))
+    bpy.data.batch_remove(ids=list(bpy.data.materials))
+
+def create_material(alpha=0.1):
+    """透明なマテリアルを作成（同じ透明度の立方体では 1 つのマテリアルを共有する）"""
+    mat = principled_material(f"CubeMaterial_{alpha:g}", {
+        "Base Color": (0.8, 0.8, 0.8, 0.1),
+        "Metallic": 0.1,
+        "Roughness": 0.3,
+        "Alpha": alpha,
+    })
     
     # 透明度の設定
     mat.use_backface_culling = False
     mat.blend_method = 'BLEND'
     mat.shadow_method = 'NONE'
-    
     return mat
 
-def create_hollow_cube(size=2.0, thickness=0.3, location=(0, 0, 0), alpha=0.1, apply=True):
-    """中空の立方体を作成"""
-    bpy.ops.mesh.primitive_cube_add(size=size, location=location)
-    cube = bpy.context.active_object
+def create_cube_mesh(size=2.0):
+    """立方体メッシュを作成（頂点と面から直接構築し、bpy.ops を使わない）"""
+    scale = size / 2.0
+    mesh = bpy.data.meshes.new("Cube")
+    mesh.from_pydata([(x * scale, y * scale, z * scale) for x, y, z in CUBE_VERTS], [], CUBE_FACES)
+    mesh.update()
+    # マテリアルはオブジェクト側に割り当てるので、メッシュには空のスロットだけを用意する
+    mesh.materials.append(None)
+    return mesh
+
+def create_hollow_cube(size=2.0, thickness=0.3, location=(0, 0, 0), alpha=0.1, apply=True, mesh=None):
+    """中空の立方体を作成（mesh を渡すとそのメッシュデータを共有する）"""
+    if mesh is None:
+        mesh = create_cube_mesh(size)
+    cube = bpy.data.objects.new("Cube", mesh)
+    cube.location = location
+    bpy.context.scene.collection.objects.link(cube)
 
     if apply:
         # Solidifyモディファイアを追加
@@ -51,10 +63,17 @@ def create_hollow_cube(size=2.0, thickness=0.3, location=(0, 0, 0), alpha=0.1, a
         solidify.offset = 0
         solidify.use_rim = True
         solidify.use_even_offset = True
+
+        # 静止画なので評価済みメッシュに焼き込み、レンダリングごとのモディファイア評価をなくす
+        depsgraph = bpy.context.evaluated_depsgraph_get()
+        cube.data = bpy.data.meshes.new_from_object(cube.evaluated_get(depsgraph))
+        cube.modifiers.clear()
     
-    # マテリアルを適用
-    mat = create_material(alpha=alpha, name=f"CubeMaterial_{location[0]}")
-    cube.data.materials.append(mat)
+    # マテリアルを適用（共有メッシュを書き換えないようオブジェクト側のスロットに割り当てる）
+    mat = create_material(alpha)
+    slot = cube.material_slots[0]
+    slot.link = 'OBJECT'
+    slot.material = mat
     
     # ワイヤーフレーム表示を有効化
     cube.show_wire = True
@@ -62,70 +81,94 @@ def create_hollow_cube(size=2.0, thickness=0.3, location=(0, 0, 0), alpha=0.1, a
     
     return cube
 
+def create_area_light(name, location, energy, size):
+    """エリアライトをデータ API で直接作成し、シーンにリンクする"""
+    light_data = bpy.data.lights.new(name=name, type='AREA')
+    light_data.energy = energy
+    light_data.size = size
+
+    light_obj = bpy.data.objects.new(name, light_data)
+    light_obj.location = location
+    bpy.context.scene.collection.objects.link(light_obj)
+    return light_obj
+
 def setup_lighting():
     """ライティングをセットアップ"""
     # メインライト
-    bpy.ops.object.light_add(type='AREA', location=(5, -5, 5))
-    main_light = bpy.context.active_object
-    main_light.data.energy = 1000
-    main_light.data.size = 5
+    main_light = create_area_light("MainLight", (5, -5, 5), energy=1000, size=5)
     
     # フィルライト
-    bpy.ops.object.light_add(type='AREA', location=(-3, -2, 3))
-    fill_light = bpy.context.active_object
-    fill_light.data.energy = 400
-    fill_light.data.size = 3
+    fill_light = create_area_light("FillLight", (-3, -2, 3), energy=400, size=3)
     
     # リムライト
-    bpy.ops.object.light_add(type='AREA', location=(0, 5, 2))
-    rim_light = bpy.context.active_object
-    rim_light.data.energy = 300
-    rim_light.data.size = 3
+    rim_light = create_area_light("RimLight", (0, 5, 2), energy=300, size=3)
+    
+    # 呼び出し側が名前で引き直さずに調整できるよう参照を返す
+    return {"main": main_light, "fill": fill_light, "rim": rim_light}
 
 def setup_camera():
     """カメラをセットアップ - X軸60度回転"""
-    bpy.ops.object.camera_add(location=(0, -12, 7))
-    camera = bpy.context.active_object
+    cam_data = bpy.data.cameras.new(name="Camera")
+    camera = bpy.data.objects.new("Camera", cam_data)
+    camera.location = (0, -12, 7)
+    bpy.context.scene.collection.objects.link(camera)
     
     # X軸60度、Y軸とZ軸は0度に設定
     camera.rotation_euler = (math.radians(60), 0, 0)
     
     bpy.context.scene.camera = camera
+    return camera
 
 def setup_render():
     """軽量化したレンダリング設定"""
     scene = bpy.context.scene
-    scene.render.engine = 'CYCLES'
-    # サンプル数を大幅に削減
-    scene.cycles.samples = 64  # 256から64に削減
     # 解像度を下げる
     scene.render.resolution_x = 1280  # 1920から1280に
     scene.render.resolution_y = 720   # 1080から720に
     
-    # 最適化設定
-    scene.cycles.use_adaptive_sampling = True
-    scene.cycles.adaptive_threshold = 0.05  # 閾値を緩める
-    scene.cycles.use_denoising = True
+    if select_engine(scene):
+        # サンプル数を大幅に削減
+        scene.cycles.samples = 64  # 256から64に削減
+
+        # 最適化設定
+        scene.cycles.use_adaptive_sampling = True
+        scene.cycles.adaptive_threshold = 0.05  # 閾値を緩める
+        scene.cycles.use_denoising = True
+
+        # GPU（OptiX/CUDA/HIP/Metal/oneAPI）でレンダリングする
+        if enable_best_gpu(parse_gpu_index()):
+            scene.cycles.tile_size = 2048
+
+        # 単純なシーンなのでバウンス数を抑え、1 パスあたりのレイ数を減らす
+        scene.cycles.max_bounces = 4
+        scene.cycles.diffuse_bounces = 2
+        scene.cycles.glossy_bounces = 2
+        scene.cycles.transmission_bounces = 2
+        scene.cycles.volume_bounces = 0
+        scene.cycles.caustics_reflective = False
+        scene.cycles.caustics_refractive = False
+        scene.cycles.light_sampling_threshold = 0.01
 
 def create_comparison_scene():
     """比較シーンを作成"""
+    # 両方の立方体で同じメッシュデータを共有し、違いはモディファイアの有無だけにする
+    mesh = create_cube_mesh(size=2.0)
+
     # オリジナルの立方体（モディファイア適用前）
-    cube1 = create_hollow_cube(size=2.0, thickness=0.3, location=(-2.5, 0, 0), alpha=0.1, apply=False)
+    cube1 = create_hollow_cube(size=2.0, thickness=0.3, location=(-2.5, 0, 0), alpha=0.1, apply=False, mesh=mesh)
     
     # モディファイア適用後の立方体
-    cube2 = create_hollow_cube(size=2.0, thickness=0.3, location=(2.5, 0, 0), alpha=0.1, apply=True)
+    cube2 = create_hollow_cube(size=2.0, thickness=0.3, location=(2.5, 0, 0), alpha=0.1, apply=True, mesh=mesh)
 
 def render_comparison():
     """比較画像をレンダリング"""
     scene = bpy.context.scene
     
     # 出力ディレクトリの作成
-    output_dir = "//output"
-    if not os.path.exists(bpy.path.abspath(output_dir)):
-        os.makedirs(bpy.path.abspath(output_dir))
+    output_dir = ensure_output()
     
     # レンダリング実行
-    scene.render.filepath = f"{output_dir}//handson_013.png"
+    scene.render.filepath = os.path.join(output_dir, "handson_013.png")
     bpy.ops.render.render(write_still=True)
 
 def main():
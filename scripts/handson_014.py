@@ -1,16 +1,21 @@
 import bpy
-import random
 import math
 import os
-from datetime import datetime
-import bmesh # type: ignore
-from mathutils import Vector, noise # type: ignore
+import sys
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import enable_best_gpu  # pylint: disable=wrong-import-position
 
 
 def clear_scene():
-    """シーンをクリアする"""
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete()
+    """シーンをクリアする（オペレーターを使わず bpy.data から直接削除し、Undo 履歴を増やさない）"""
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    # オブジェクトの削除で参照されなくなったデータも削除
+    for collection in (bpy.data.meshes, bpy.data.materials, bpy.data.lights, bpy.data.cameras):
+        for item in list(collection):
+            collection.remove(item)
 
 
 def create_camo_colors():
@@ -33,80 +38,61 @@ def create_base_mesh(mesh_type="CUBE"):
     obj = bpy.context.active_object
 
     # サブディビジョンモディファイアを追加して細分化
+    # （適用せずに残し、レンダリング時に Cycles のアダプティブサブディビジョンで
+    #   カメラから見た細かさに応じて分割する）
     subdiv = obj.modifiers.new(name="Subdivision", type="SUBSURF")
-    subdiv.levels = 8
-    subdiv.render_levels = 8
+    subdiv.subdivision_type = "CATMULL_CLARK"
+    subdiv.levels = 2  # ビューポート表示用
+    # 模様はシェーダーで生成するので、形状の滑らかさに足りる分割数で十分
+    # （レベル 8 はレベル 5 の 64 倍の頂点数になる。アダプティブサブディビジョンが使えない場合の分割数）
+    subdiv.render_levels = 5
+
+    scene = bpy.context.scene
+    scene.cycles.feature_set = "EXPERIMENTAL"  # アダプティブサブディビジョンに必要
+    scene.cycles.dicing_rate = 1.0
+    # 640x480 の出力では、これ以上細かく分割しても見た目が変わらない
+    scene.cycles.max_subdivisions = 6
+    obj.cycles.use_adaptive_subdivision = True
+    obj.cycles.dicing_rate = 1.0
 
-    # モディファイアを適用
     bpy.ops.object.shade_smooth()
-    bpy.ops.object.modifier_apply(modifier="Subdivision")
 
     return obj
 
 
-def generate_noise_texture(scale=1.5):
-    """ノイズテクスチャを生成"""
-
-    def noise_at(x, y, z):
-        # 3つのスケールの異なるノイズを合成
-        vec1 = Vector((x * scale, y * scale, z * scale))
-        vec2 = Vector((x * scale * 2, y * scale * 2, z * scale * 2))
-        vec3 = Vector((x * scale * 4, y * scale * 4, z * scale * 4))
-
-        n1 = noise.noise(vec1)  # 基本パターン
-        n2 = noise.noise(vec2) * 0.5  # 中間的な詳細
-        n3 = noise.noise(vec3) * 0.25  # 細かい詳細
-
-        return (n1 + n2 + n3) / 1.5  # スケーリング調整
-
-    return noise_at
-
-
-def apply_vertex_paint(obj, colors):
-    """頂点カラーを適用"""
-    mesh = obj.data
-    if not mesh.vertex_colors:
-        mesh.vertex_colors.new()
-
-    color_layer = mesh.vertex_colors.active
-    noise_func = generate_noise_texture()
-
-    # BMeshを使用して頂点の位置情報にアクセス
-    bm = bmesh.new()
-    bm.from_mesh(mesh)
-    bm.verts.ensure_lookup_table()
-
-    # 各頂点に色を適用
-    for poly in mesh.polygons:
-        for idx, loop_idx in enumerate(poly.loop_indices):
-            vertex_idx = mesh.loops[loop_idx].vertex_index
-            vertex = bm.verts[vertex_idx]
-
-            # ノイズ値に基づいて色を選択
-            noise_val = noise_func(vertex.co.x, vertex.co.y, vertex.co.z)
-            color_idx = int((noise_val + 1) * len(colors) / 2) % len(colors)
-
-            # 色をわずかにランダム化
-            color = list(colors[color_idx])
-            for i in range(3):
-                color[i] += random.uniform(-0.05, 0.05)
-                color[i] = max(0, min(1, color[i]))
-
-            color_layer.data[loop_idx].color = color
-
-    bm.free()
-
-
-def setup_material(obj):
-    """マテリアルをセットアップ"""
+def setup_material(obj, colors, scale=1.5):
+    """
+    マテリアルをセットアップ
+    （メッシュはレンダリング時に分割されるため、頂点カラーではなく
+      ノイズテクスチャ＋カラーランプで迷彩パターンをシェーダー内で生成する）
+    """
     mat = bpy.data.materials.new(name="CamoMaterial")
     mat.use_nodes = True
     nodes = mat.node_tree.nodes
+    links = mat.node_tree.links
     nodes.clear()
 
-    # 頂点カラーノードを追加
-    vertex_color = nodes.new("ShaderNodeVertexColor")
-    vertex_color.layer_name = obj.data.vertex_colors.active.name
+    # オブジェクト座標でノイズを評価（3つのスケールのノイズを合成）
+    tex_coord = nodes.new("ShaderNodeTexCoord")
+    noise_tex = nodes.new("ShaderNodeTexNoise")
+    noise_tex.inputs["Scale"].default_value = scale
+    noise_tex.inputs["Detail"].default_value = 2.0  # 基本パターン＋中間的な詳細＋細かい詳細
+    noise_tex.inputs["Roughness"].default_value = 0.5
+    links.new(tex_coord.outputs["Object"], noise_tex.inputs["Vector"])
+
+    # ノイズ値を等間隔に区切って迷彩色を割り当てる
+    color_ramp = nodes.new("ShaderNodeValToRGB")
+    ramp = color_ramp.color_ramp
+    ramp.interpolation = "CONSTANT"
+    # 既定の 2 つの要素（位置 0 と 1）を先頭 2 色に使い、残りの色は要素を追加する
+    for i, color in enumerate(colors):
+        if i < 2:
+            element = ramp.elements[i]
+            element.position = i / len(colors)
+        else:
+            element = ramp.elements.new(i / len(colors))
+        element.color = color
+    links.new(noise_tex.outputs["Fac"], color_ramp.inputs["Fac"])
 
     # プリンシプルBSDFを追加
     principled = nodes.new("ShaderNodeBsdfPrincipled")
@@ -114,10 +100,8 @@ def setup_material(obj):
     principled.inputs["Metallic"].default_value = 0.1
 
     # ノードを接続
-    mat.node_tree.links.new(
-        vertex_color.outputs["Color"], principled.inputs["Base Color"]
-    )
-    mat.node_tree.links.new(
+    links.new(color_ramp.outputs["Color"], principled.inputs["Base Color"])
+    links.new(
         principled.outputs["BSDF"],
         nodes.new("ShaderNodeOutputMaterial").inputs["Surface"],
     )
@@ -177,6 +161,9 @@ def setup_render():
     """レンダリング設定"""
     scene = bpy.context.scene
     scene.render.engine = "CYCLES"
+    if enable_best_gpu():
+        # GPU では大きなタイルでカーネル起動やデノイズの準備のオーバーヘッドを減らす
+        scene.cycles.tile_size = 2048
     scene.cycles.samples = 64
     scene.render.resolution_x = 640
     scene.render.resolution_y = 480
@@ -199,8 +186,6 @@ def render_output():
     if not os.path.exists(bpy.path.abspath(output_dir)):
         os.makedirs(bpy.path.abspath(output_dir))
 
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    # scene.render.filepath = f"{output_dir}//camo_mesh_{timestamp}.png"
     scene.render.filepath = f"{output_dir}//handson_014.png"
 
     # レンダリング実行
@@ -218,12 +203,9 @@ def main():
         # メッシュを作成
         obj = create_base_mesh(mesh_type="CUBE")
 
-        # 迷彩パターンを適用
+        # 迷彩パターンのマテリアルとライティングをセットアップ
         colors = create_camo_colors()
-        apply_vertex_paint(obj, colors)
-
-        # マテリアルとライティングをセットアップ
-        setup_material(obj)
+        setup_material(obj, colors)
         setup_lighting()
         setup_camera()
 
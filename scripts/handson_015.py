@@ -1,8 +1,14 @@
 import bpy
 import os
+import sys
 import time
 from datetime import datetime
 
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, setup_denoised_sampling  # pylint: disable=wrong-import-position
+
 # 出力ディレクトリ
 output_dir = "output"
 
@@ -37,25 +43,12 @@ def create_wireframe_object():
     modifier.thickness = 0.02      # ワイヤーの太さ
 
     # マテリアルをシンプルに設定 (今回は特に変更不要)
-    material = bpy.data.materials.new(name="WireframeMaterial")
-    material.use_nodes = True
-
-    # ノードツリーの取得とノードのクリア
-    node_tree = material.node_tree
-    for node in node_tree.nodes:
-        node_tree.nodes.remove(node)
-
-    # Principled BSDF ノードの追加
-    principled_bsdf = node_tree.nodes.new(type='ShaderNodeBsdfPrincipled')
-    principled_bsdf.inputs["Base Color"].default_value = (0.8, 0.8, 0.8, 1.0) # 白っぽい色
-    principled_bsdf.inputs["Metallic"].default_value = 0.0
-    principled_bsdf.inputs["Roughness"].default_value = 0.4
-
-    # Material Output ノードの追加
-    material_output = node_tree.nodes.new(type='ShaderNodeOutputMaterial')
-
-    # ノードのリンク
-    node_tree.links.new(principled_bsdf.outputs["BSDF"], material_output.inputs["Surface"])
+    # 共通テンプレート（Principled BSDF → Material Output）を複製して入力値だけを設定
+    material = principled_material("WireframeMaterial", {
+        "Base Color": (0.8, 0.8, 0.8, 1.0),  # 白っぽい色
+        "Metallic": 0.0,
+        "Roughness": 0.4,
+    })
 
     cube.data.materials.append(material)
 
@@ -83,7 +76,11 @@ def setup_render_settings(output_filepath):
     # レンダリング設定
     scene = bpy.context.scene
     scene.render.engine = 'CYCLES'  # Cyclesレンダーエンジンを使用
-    scene.cycles.samples = 128
+    backend = enable_best_gpu()  # GPU があれば GPU でレンダリング
+    if backend:
+        # GPU では大きなタイルでカーネル起動やデノイズの準備のオーバーヘッドを減らす
+        scene.cycles.tile_size = 2048
+    setup_denoised_sampling(scene, samples=32, backend=backend)
     scene.cycles.max_bounces = 4
 
     scene.render.resolution_x = 800
@@ -1,8 +1,13 @@
 import bpy
 import os
+import sys
 import time
 import datetime
-import random
+import numpy as np
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import enable_best_gpu, setup_denoised_sampling  # pylint: disable=wrong-import-position
 
 # 出力ディレクトリ
 output_dir = "output"
@@ -22,6 +27,10 @@ min_brightness = 0.2  # 星の最小輝度
 max_brightness = 1.0  # 星の最大輝度
 color_variation = 0.1 # 星の色のばらつき（0で白、1で完全にランダム）
 
+# デバッグ用：DEBUG_SAVE=1 のときだけレンダリング前のシーンを .blend に保存する
+debug_save = os.environ.get("DEBUG_SAVE") == "1"
+debug_blend_path = os.path.join(output_dir, output_base + ".blend")
+
 def ensure_output_dir():
     """出力ディレクトリが存在しない場合は作成する"""
     if not os.path.exists(output_dir):
@@ -39,9 +48,12 @@ def backup_existing_file(filepath):
 def create_starry_sky():
     """頂点カラーを使って星空のようなシーンを作成・レンダリングする"""
 
-    # 既存のオブジェクトを削除
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
+    # 既存のオブジェクトを削除（オペレーターを使わず bpy.data から直接削除）
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    for collection in (bpy.data.meshes, bpy.data.materials, bpy.data.lights, bpy.data.cameras):
+        for item in list(collection):
+            collection.remove(item)
 
     # Worldを設定 (背景色を黒に)
     world = bpy.data.worlds.new("World")
@@ -55,28 +67,38 @@ def create_starry_sky():
     bg_node.inputs["Strength"].default_value = 0.0
 
     # 高密度の平面を作成（細分化）
-    bpy.ops.mesh.primitive_plane_add(size=star_size, enter_editmode=True, location=(0, 0, 0))
-    bpy.ops.mesh.subdivide(number_cuts=int((num_stars)**0.5 -1)) # 頂点数がnum_starsに近くなるように
-    bpy.ops.object.mode_set(mode='OBJECT')  # オブジェクトモードに戻る
-    plane = bpy.context.object
+    # 格子の頂点と面を NumPy で求めて直接メッシュを構築する（編集モードの切り替えや subdivide オペレーターを使わない）
+    n = int(num_stars**0.5)  # 一辺の分割数（頂点数がnum_starsに近くなるように）
+    xs = np.linspace(-star_size / 2, star_size / 2, n + 1, dtype=np.float32)
+    gx, gy = np.meshgrid(xs, xs)
+    verts = np.stack([gx.ravel(), gy.ravel(), np.zeros(gx.size, dtype=np.float32)], axis=1)
+    idx = np.arange((n + 1) * (n + 1)).reshape(n + 1, n + 1)
+    faces = np.stack([idx[:-1, :-1], idx[:-1, 1:], idx[1:, 1:], idx[1:, :-1]], axis=-1).reshape(-1, 4)
+    mesh = bpy.data.meshes.new("Plane")
+    mesh.from_pydata(verts.tolist(), [], faces.tolist())
+    mesh.update()
+    plane = bpy.data.objects.new("Plane", mesh)
+    bpy.context.scene.collection.objects.link(plane)
     
-    # 頂点カラーレイヤーを追加
-    if not plane.data.vertex_colors:
-        color_layer = plane.data.vertex_colors.new()
-    else:
-        color_layer = plane.data.vertex_colors.active
-
-     # 各頂点にランダムな頂点カラーを設定
-    loop_index = 0
-    for poly in plane.data.polygons:
-        for loop_index_in_poly in poly.loop_indices:
-            brightness = random.uniform(min_brightness, max_brightness)
-             # 色のばらつきを追加
-            r = max(0, min(1, brightness + random.uniform(-color_variation, color_variation)))
-            g = max(0, min(1, brightness + random.uniform(-color_variation, color_variation)))
-            b = max(0, min(1, brightness + random.uniform(-color_variation, color_variation)))
-            color_layer.data[loop_index].color = (r, g, b, 1.0)
-            loop_index += 1
+    # 各頂点の明るさを NumPy で一度に生成し、単一チャンネルの float 属性としてまとめて書き込む
+    rng = np.random.default_rng()
+    nverts = len(mesh.vertices)
+    brightness = rng.uniform(min_brightness, max_brightness, nverts).astype(np.float32)
+    bright_attr = mesh.attributes.new(name="StarBright", type='FLOAT', domain='POINT')
+    bright_attr.data.foreach_set("value", brightness)
+
+    # 色のばらつきがある場合だけ、明るさにばらつきを加えた頂点カラーレイヤーを追加
+    color_layer = None
+    if color_variation > 0:
+        color_layer = mesh.vertex_colors.new()
+        nloops = len(mesh.loops)
+        loop_vertex = np.empty(nloops, dtype=np.int32)
+        mesh.loops.foreach_get("vertex_index", loop_vertex)
+        rgba = np.ones((nloops, 4), dtype=np.float32)
+        rgba[:, :3] = np.clip(
+            brightness[loop_vertex, None] + rng.uniform(-color_variation, color_variation, (nloops, 3)), 0, 1
+        )
+        color_layer.data.foreach_set("color", rgba.ravel())
     
     # マテリアルを作成
     material = bpy.data.materials.new(name="StarMaterial")
@@ -92,14 +114,20 @@ def create_starry_sky():
     output_node = nodes.new(type='ShaderNodeOutputMaterial')
     output_node.location = (400, 0)
     
-    # Attributeノード (頂点カラーを取得)
-    attribute_node = nodes.new(type="ShaderNodeAttribute")
-    attribute_node.attribute_name = color_layer.name # 頂点カラーレイヤーの名前
-    attribute_node.location = (0, 0)
+    # Attributeノード (明るさを取得し、スカラーのまま発光強度に使う)
+    bright_node = nodes.new(type="ShaderNodeAttribute")
+    bright_node.attribute_name = bright_attr.name
+    bright_node.location = (0, -200)
+    material.node_tree.links.new(bright_node.outputs["Fac"], emission_node.inputs["Strength"])
+
+    if color_layer is not None:
+        # Attributeノード (頂点カラーを取得)
+        attribute_node = nodes.new(type="ShaderNodeAttribute")
+        attribute_node.attribute_name = color_layer.name # 頂点カラーレイヤーの名前
+        attribute_node.location = (0, 0)
+        material.node_tree.links.new(attribute_node.outputs["Color"], emission_node.inputs["Color"])
 
     # ノードを接続
-    material.node_tree.links.new(attribute_node.outputs["Color"], emission_node.inputs["Color"])
-    material.node_tree.links.new(attribute_node.outputs["Color"], emission_node.inputs["Strength"]) # 明るさも頂点カラーで制御
     material.node_tree.links.new(emission_node.outputs['Emission'], output_node.inputs['Surface'])
     
     # プレーンにマテリアルを割り当て
@@ -109,8 +137,11 @@ def create_starry_sky():
         plane.data.materials.append(material)
 
      # 頂点をランダムに少しだけ上下に動かす（オプション）
-    for vert in plane.data.vertices:
-        vert.co.z += random.uniform(-0.1, 0.1) * star_size /10.0
+    co = np.empty(nverts * 3, dtype=np.float32)
+    plane.data.vertices.foreach_get("co", co)
+    co[2::3] += rng.uniform(-0.1, 0.1, nverts).astype(np.float32) * star_size / 10.0
+    plane.data.vertices.foreach_set("co", co)
+    plane.data.update()
 
     # カメラを設定
     bpy.ops.object.camera_add(location=(0, 0, star_size * 2.5), rotation=(0, 0, 0))
@@ -120,14 +151,20 @@ def create_starry_sky():
     # レンダリング設定
     scene = bpy.context.scene
     scene.render.engine = 'CYCLES'
-    scene.cycles.samples = cycles_samples
+    backend = enable_best_gpu()  # GPU があれば GPU でレンダリング
+    if backend:
+        # GPU では大きなタイルでカーネル起動やデノイズの準備のオーバーヘッドを減らす
+        scene.cycles.tile_size = 2048
+    setup_denoised_sampling(scene, samples=cycles_samples, backend=backend)
     scene.render.resolution_x = resolution_x
     scene.render.resolution_y = resolution_y
     scene.render.filepath = os.path.join(output_dir, output_base + ".png")
     scene.render.image_settings.file_format = 'PNG'
 
-    # レンダリング前にファイルを保存
-    bpy.ops.wm.save_mainfile(filepath="temp.blend")
+    # デバッグ時のみレンダリング前にファイルを保存（レンダリング自体には保存は不要）
+    if debug_save:
+        bpy.ops.wm.save_as_mainfile(filepath=os.path.abspath(debug_blend_path), copy=True)
+        print(f"Scene saved to: {debug_blend_path}")
 
     # レンダリング
     start_time = time.time()
@@ -136,9 +173,6 @@ def create_starry_sky():
 
     print(f"Rendering took {end_time - start_time:.2f} seconds")
 
-    # 一時ファイルの削除
-    os.remove("temp.blend")
-
 
 
 if __name__ == "__main__":
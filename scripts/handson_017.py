@@ -1,7 +1,13 @@
 import bpy
 import os
+import sys
 import time
 
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, setup_denoised_sampling  # pylint: disable=wrong-import-position
+
 # 設定
 OUTPUT_DIR = "output"
 FILE_PREFIX = "handson_017"
@@ -75,25 +81,11 @@ def initialize_scene(scene):
         plane = bpy.context.object
         
         # 床のマテリアルをより環境に溶け込む設定に
-        mat = bpy.data.materials.new(name="InfiniteFloor")
-        mat.use_nodes = True
-
-        # Principled BSDFが存在するか確認
-        if not mat.node_tree.nodes.get("Principled BSDF"):
-             bsdf = mat.node_tree.nodes.new('ShaderNodeBsdfPrincipled')
-             bsdf.location = (200,0)
-
-             material_output = mat.node_tree.nodes.get("Material Output")
-             if not material_output:
-                 material_output = mat.node_tree.nodes.new('ShaderNodeOutputMaterial')
-
-             mat.node_tree.links.new(bsdf.outputs['BSDF'], material_output.inputs['Surface'])
-        else:
-            bsdf = mat.node_tree.nodes["Principled BSDF"]
-
-        bsdf.inputs["Base Color"].default_value = (0.98, 0.98, 0.98, 1)  # わずかにオフホワイト
-        bsdf.inputs["Roughness"].default_value = 0.2  # 適度な反射
-        bsdf.inputs["Metallic"].default_value = 0.0  # 金属感なし
+        mat = principled_material("InfiniteFloor", {
+            "Base Color": (0.98, 0.98, 0.98, 1),  # わずかにオフホワイト
+            "Roughness": 0.2,  # 適度な反射
+            "Metallic": 0.0,  # 金属感なし
+        })
 
         plane.data.materials.append(mat)
 
@@ -135,25 +127,8 @@ def create_and_place_object(scene):
     bpy.ops.mesh.primitive_cube_add(size=1, enter_editmode=False, align='WORLD', location=(0, 0, 0), scale=(1, 1, 1))
     cube = bpy.context.object
 
-    # マテリアルの作成と適用
-    material = bpy.data.materials.new(name="WhiteMaterial")
-    material.use_nodes = True
-
-    bsdf = None
-    if not material.node_tree.nodes.get("Principled BSDF"):
-        bsdf = material.node_tree.nodes.new('ShaderNodeBsdfPrincipled')
-        bsdf.location = (200,0)
-
-        material_output = material.node_tree.nodes.get("Material Output")
-        if not material_output:
-            material_output = material.node_tree.nodes.new('ShaderNodeOutputMaterial')
-
-        material.node_tree.links.new(bsdf.outputs['BSDF'], material_output.inputs['Surface'])
-    else:
-        bsdf = material.node_tree.nodes["Principled BSDF"]
-
-    if bsdf:
-        bsdf.inputs["Base Color"].default_value = (1, 1, 1, 1)  # 白色
+    # マテリアルの作成と適用（既に同名のマテリアルがあれば再利用）
+    material = principled_material("WhiteMaterial", {"Base Color": (1, 1, 1, 1)})  # 白色
 
     cube.data.materials.append(material)
 
@@ -166,8 +141,11 @@ def setup_rendering(scene, output_path):
     scene.render.resolution_y = 512
     scene.render.resolution_percentage = 100
     scene.render.engine = 'CYCLES'
-    bpy.context.scene.cycles.device = 'GPU'
-    bpy.context.scene.cycles.samples = 64
+    backend = enable_best_gpu()  # 利用可能な GPU デバイスを有効化してから GPU レンダリングに切り替える
+    if backend:
+        # GPU では大きなタイルでカーネル起動やデノイズの準備のオーバーヘッドを減らす
+        scene.cycles.tile_size = 2048
+    setup_denoised_sampling(scene, samples=32, backend=backend)
     scene.view_settings.look = 'None'
     scene.render.film_transparent = False
 
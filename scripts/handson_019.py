@@ -10,12 +10,25 @@ Blender 4.0.2 用スクリプト
 初期状態でカメラがシーン中央（対象オブジェクト群）を向くよう「Track To」制約を追加しています。
 
 出力は "output/animation.mp4" に保存し、同一ファイルが存在する場合は退避します。
+
+Usage:
+    blender --background --python handson_019.py
+    blender --background --python handson_019.py -- --farm 4   # 4 プロセスに分けてレンダリング
 """
 
+import argparse
+import array
 import bpy
 import os
-import shutil
-from datetime import datetime
+import sys
+import time
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import render_animation_shards, select_eevee  # pylint: disable=wrong-import-position
+
+# BLENDER_QUALITY=final で本番品質、既定（preview）はサンプル数を抑えた確認用
+QUALITY = os.environ.get("BLENDER_QUALITY", "preview")
 
 
 def backup_existing_file(filepath):
@@ -25,27 +38,25 @@ def backup_existing_file(filepath):
     Args:
         filepath (str): 出力ファイルのパス
     """
-    if os.path.exists(filepath):
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        base, ext = os.path.splitext(filepath)
-        backup_path = f"{base}_backup_{timestamp}{ext}"
-        shutil.move(filepath, backup_path)
+    timestamp = int(time.time())
+    base, ext = os.path.splitext(filepath)
+    backup_path = f"{base}_backup_{timestamp}{ext}"
+    # 事前の存在確認はせず、リネーム 1 回で退避する（ファイルがなければ何もしない）
+    try:
+        os.replace(filepath, backup_path)
+    except FileNotFoundError:
+        pass
 
 
 def clear_scene():
     """
     現在のシーン内の全オブジェクトを削除し、使用済みデータブロックもクリーンアップします.
     """
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete(use_global=False)
-    for block in bpy.data.meshes:
-        bpy.data.meshes.remove(block)
-    for block in bpy.data.curves:
-        bpy.data.curves.remove(block)
-    for block in bpy.data.cameras:
-        bpy.data.cameras.remove(block)
-    for block in bpy.data.lights:
-        bpy.data.lights.remove(block)
+    # オペレーターを使わずにオブジェクトを直接削除
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    # 参照されなくなったメッシュ・カーブ・カメラ・ライトなどを 1 回の呼び出しでまとめて削除
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
 
 
 def create_curve():
@@ -63,21 +74,17 @@ def create_curve():
     points = spline.bezier_points
 
     # 制御点の設定（Z座標は元の値の2/3に調整）
-    points[0].co = (0.0, 0.0, 0.0)
-    points[0].handle_left = (-1.0, -1.0, 0.0)
-    points[0].handle_right = (1.0, 1.0, 0.0)
-
-    points[1].co = (2.0, 2.0, 2.0 * 2/3)  # 約1.33
-    points[1].handle_left = (1.0, 1.0, 2.0 * 2/3)
-    points[1].handle_right = (3.0, 3.0, 2.0 * 2/3)
-
-    points[2].co = (4.0, 0.0, 4.0 * 2/3)  # 約2.67
-    points[2].handle_left = (3.0, -1.0, 4.0 * 2/3)
-    points[2].handle_right = (5.0, 1.0, 4.0 * 2/3)
-
-    points[3].co = (6.0, -2.0, 6.0 * 2/3)  # 6*2/3 = 4.0
-    points[3].handle_left = (5.0, -3.0, 6.0 * 2/3)
-    points[3].handle_right = (7.0, -1.0, 6.0 * 2/3)
+    # (co, handle_left, handle_right) を点ごとに並べ、座標の配列として一括で設定する
+    control_points = (
+        ((0.0, 0.0, 0.0), (-1.0, -1.0, 0.0), (1.0, 1.0, 0.0)),
+        ((2.0, 2.0, 2.0 * 2/3), (1.0, 1.0, 2.0 * 2/3), (3.0, 3.0, 2.0 * 2/3)),  # 約1.33
+        ((4.0, 0.0, 4.0 * 2/3), (3.0, -1.0, 4.0 * 2/3), (5.0, 1.0, 4.0 * 2/3)),  # 約2.67
+        ((6.0, -2.0, 6.0 * 2/3), (5.0, -3.0, 6.0 * 2/3), (7.0, -1.0, 6.0 * 2/3)),  # 6*2/3 = 4.0
+    )
+    for i, attr in enumerate(("co", "handle_left", "handle_right")):
+        # float 型の array を渡すと、要素ごとの変換をせずにバッファをそのままコピーできる
+        coords = array.array('f', (v for point in control_points for v in point[i]))
+        points.foreach_set(attr, coords)
 
     # パスアニメーション有効化（30fps で10秒 = 300フレーム）
     curve_data.use_path = True
@@ -88,6 +95,27 @@ def create_curve():
     return curve_obj
 
 
+def insert_keyframes(id_data, data_path, keyframes):
+    """
+    (フレーム, 値) の組をまとめて F カーブに書き込みます.
+    keyframe_insert を 1 キーずつ呼ぶ代わりに、キーを一括で追加して座標を foreach_set で設定します.
+    （追加したキーは keyframe_insert と同じくベジェ補間・自動ハンドルになります）
+
+    Args:
+        id_data (ID): アニメーションさせるデータブロック（オブジェクト、カメラデータなど）
+        data_path (str): アニメーションさせるプロパティのデータパス
+        keyframes (list): (フレーム, 値) のリスト
+    """
+    anim_data = id_data.animation_data_create()
+    if anim_data.action is None:
+        anim_data.action = bpy.data.actions.new(name=f"{id_data.name}Action")
+    fcurve = anim_data.action.fcurves.new(data_path)
+    fcurve.keyframe_points.add(count=len(keyframes))
+    fcurve.keyframe_points.foreach_set("co", [v for keyframe in keyframes for v in keyframe])
+    # キーの並びとハンドルを再計算
+    fcurve.update()
+
+
 def create_path_follower(curve):
     """
     空のオブジェクトを作成し、Follow Path制約を追加してカーブに沿って移動するアニメーションを設定します.
@@ -105,10 +133,8 @@ def create_path_follower(curve):
     constraint.use_curve_follow = True
     constraint.forward_axis = 'FORWARD_Y'
     constraint.up_axis = 'UP_Z'
-    constraint.offset_factor = 0.0
-    constraint.keyframe_insert(data_path="offset_factor", frame=1)
-    constraint.offset_factor = 1.0
-    constraint.keyframe_insert(data_path="offset_factor", frame=300)
+    # 制約のプロパティのアニメーションは、制約を持つオブジェクト側の F カーブになる
+    insert_keyframes(follower, constraint.path_from_id("offset_factor"), [(1, 0.0), (300, 1.0)])
     return follower
 
 
@@ -138,10 +164,7 @@ def animate_camera_zoom(camera):
     Args:
         camera (Object): 対象のカメラオブジェクト
     """
-    camera.data.lens = 35.0
-    camera.data.keyframe_insert(data_path="lens", frame=1)
-    camera.data.lens = 70.0
-    camera.data.keyframe_insert(data_path="lens", frame=300)
+    insert_keyframes(camera.data, "lens", [(1, 35.0), (300, 70.0)])
 
 
 def setup_render_settings(output_filepath):
@@ -152,7 +175,11 @@ def setup_render_settings(output_filepath):
         output_filepath (str): 出力ファイルのフルパス
     """
     scene = bpy.context.scene
-    scene.render.engine = 'BLENDER_EEVEE'
+    if select_eevee(scene, fallback_samples=16 if QUALITY == "preview" else 32):
+        # EEVEE の負荷はほぼ TAA のサンプル数に比例する（既定は 64）
+        scene.eevee.taa_render_samples = 16 if QUALITY == "preview" else 32
+    if QUALITY == "preview":
+        scene.render.use_motion_blur = False
     scene.render.filepath = output_filepath
     scene.render.image_settings.file_format = 'FFMPEG'
     scene.render.ffmpeg.format = 'MPEG4'
@@ -184,36 +211,26 @@ def create_material(name, base_color):
     return mat
 
 
-def add_materials_to_objects():
+def add_materials_to_objects(plane, cube, sphere):
     """
     Plane、Cube、Sphere に個別のマテリアルを設定し、レンダリングで識別しやすいようにします.
+    （作成直後のオブジェクトを受け取り、名前による検索はしません）
+
+    Args:
+        plane (Object): 床のオブジェクト
+        cube (Object): キューブのオブジェクト
+        sphere (Object): 球のオブジェクト
     """
-    # 床 (Plane): 明るいグレー
-    plane = bpy.data.objects.get("Plane")
-    if plane is not None:
-        mat_plane = create_material("FloorMaterial", (0.8, 0.8, 0.8, 1.0))
-        if plane.data.materials:
-            plane.data.materials[0] = mat_plane
-        else:
-            plane.data.materials.append(mat_plane)
-
-    # Cube: 鮮やかな赤
-    cube = bpy.data.objects.get("Cube")
-    if cube is not None:
-        mat_cube = create_material("CubeMaterial", (0.8, 0.1, 0.1, 1.0))
-        if cube.data.materials:
-            cube.data.materials[0] = mat_cube
+    for obj, name, color in (
+        (plane, "FloorMaterial", (0.8, 0.8, 0.8, 1.0)),  # 床 (Plane): 明るいグレー
+        (cube, "CubeMaterial", (0.8, 0.1, 0.1, 1.0)),  # Cube: 鮮やかな赤
+        (sphere, "SphereMaterial", (0.1, 0.1, 0.8, 1.0)),  # Sphere: 鮮やかな青
+    ):
+        mat = create_material(name, color)
+        if obj.data.materials:
+            obj.data.materials[0] = mat
         else:
-            cube.data.materials.append(mat_cube)
-
-    # Sphere: 鮮やかな青
-    sphere = bpy.data.objects.get("Sphere")
-    if sphere is not None:
-        mat_sphere = create_material("SphereMaterial", (0.1, 0.1, 0.8, 1.0))
-        if sphere.data.materials:
-            sphere.data.materials[0] = mat_sphere
-        else:
-            sphere.data.materials.append(mat_sphere)
+            obj.data.materials.append(mat)
 
 
 def create_sun_light():
@@ -232,7 +249,9 @@ def setup_world_background():
     ワールド背景を調整し、落ち着いた深みのある色合いに設定します.
     """
     world = bpy.context.scene.world
-    world.use_nodes = True
+    # 既存の Background ノードの値だけを変え、ノードツリーは作り直さない
+    if not world.use_nodes:
+        world.use_nodes = True
     nodes = world.node_tree.nodes
     bg = nodes.get("Background")
     if bg:
@@ -270,6 +289,19 @@ def setup_camera_track(camera, target):
     constraint.up_axis = 'UP_Y'
 
 
+def parse_args():
+    """
+    Blender の引数のうち "--" 以降をスクリプトの引数として解釈します.
+
+    Returns:
+        Namespace: farm（並列にレンダリングする Blender プロセス数）
+    """
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(description="カメラがカーブに沿って移動する動画をレンダリング")
+    parser.add_argument("--farm", type=int, default=1, help="フレーム範囲を分割してレンダリングする Blender プロセス数")
+    return parser.parse_known_args(argv)[0]
+
+
 def main():
     """
     メイン処理:
@@ -277,8 +309,10 @@ def main():
     - シーン初期化、ライティング・背景・オブジェクトの作成とマテリアル設定
     - カーブ、Empty(パスフォロワー)およびカメラの作成とアニメーション設定
     - カメラが初期状態からターゲット（シーン中央）を向くように設定
-    - アニメーションレンダリング実行
+    - アニメーションレンダリング実行（--farm N の指定時は N プロセスに分割）
     """
+    args = parse_args()
+
     # 出力フォルダの設定
     output_dir = os.path.join(os.getcwd(), "output")
     if not os.path.exists(output_dir):
@@ -293,9 +327,12 @@ def main():
 
     # オブジェクト追加
     bpy.ops.mesh.primitive_plane_add(size=20, location=(0.0, 0.0, -1.0))
+    plane = bpy.context.active_object
     bpy.ops.mesh.primitive_cube_add(size=1, location=(2.0, 0.0, 0.0))
+    cube = bpy.context.active_object
     bpy.ops.mesh.primitive_uv_sphere_add(radius=0.5, location=(-2.0, 0.0, 1.0))
-    add_materials_to_objects()
+    sphere = bpy.context.active_object
+    add_materials_to_objects(plane, cube, sphere)
 
     # カメラ移動用カーブの作成と、カーブに沿って移動する Empty（PathFollower）の生成
     curve = create_curve()
@@ -310,6 +347,11 @@ def main():
 
     setup_render_settings(output_filepath)
 
+    if args.farm > 1:
+        # シーンの FFMPEG / H264 設定のままシャードごとに MP4 を書き出し、ffmpeg で連結する
+        render_animation_shards(output_filepath, args.farm)
+        return
+
     # アニメーションレンダリング実行
     bpy.ops.render.render(animation=True)
 
@@ -11,9 +11,16 @@ Blender 4.0.2 (M2 Mac Studio) 用のバックグラウンドレンダリング
 - 照明・露出・マテリアルを調整して暗くなりすぎるのを防ぐ
 """
 
+import bmesh
 import bpy
+import mathutils
 import os
-import datetime
+import sys
+import time
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import select_eevee  # pylint: disable=wrong-import-position
 
 
 def clear_scene() -> None:
@@ -31,11 +38,14 @@ def backup_existing_file(filepath: str) -> None:
     Args:
         filepath: 退避対象のファイルパス
     """
-    if os.path.exists(filepath):
-        base, ext = os.path.splitext(filepath)
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_filepath = f"{base}_backup_{timestamp}{ext}"
-        os.rename(filepath, backup_filepath)
+    base, ext = os.path.splitext(filepath)
+    timestamp = int(time.time())
+    backup_filepath = f"{base}_backup_{timestamp}{ext}"
+    # 事前の存在確認はせず、リネーム 1 回で退避する（ファイルがなければ何もしない）
+    try:
+        os.replace(filepath, backup_filepath)
+    except FileNotFoundError:
+        pass
 
 
 def setup_scene() -> None:
@@ -44,15 +54,25 @@ def setup_scene() -> None:
     カメラがオブジェクトを注視するように設定します。
     さらに、明るいマテリアルやライトを追加し、暗くなりすぎないように調整します。
     """
+    # オペレーターを使わず、各データブロックを直接作成してシーンにリンクする
+    collection = bpy.context.collection
+
     # Suzanne（モンキー）オブジェクトを追加し、サイズを拡大して巨大に見せる
-    bpy.ops.mesh.primitive_monkey_add(size=1.0, location=(0, 1, 0))
-    monkey = bpy.context.active_object
+    # （bmesh のモンキーは primitive_monkey_add の size=2 相当なので、半分に縮めて size=1 に合わせる）
+    monkey_mesh = bpy.data.meshes.new("Suzanne")
+    bm = bmesh.new()
+    bmesh.ops.create_monkey(bm, matrix=mathutils.Matrix.Scale(0.5, 4))
+    bm.to_mesh(monkey_mesh)
+    bm.free()
+    monkey = bpy.data.objects.new("Suzanne", monkey_mesh)
+    monkey.location = (0, 1, 0)
     monkey.scale = (2, 2, 2)
+    collection.objects.link(monkey)
 
     # カメラを低い位置に追加（オブジェクトより下に配置）
-    camera_location = (0, -2, -1)
-    bpy.ops.object.camera_add(location=camera_location)
-    camera = bpy.context.active_object
+    camera = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    camera.location = (0, -2, -1)
+    collection.objects.link(camera)
 
     # カメラが常にモンキーを注視するよう、トラック制約を設定
     track_constraint = camera.constraints.new(type="TRACK_TO")
@@ -61,13 +81,15 @@ def setup_scene() -> None:
     track_constraint.up_axis = "UP_Y"
 
     # 照明としてサンライトを上部に追加し、強度を上げる
-    bpy.ops.object.light_add(type="SUN", location=(0, 0, 10))
-    sun_light = bpy.context.active_object
+    sun_light = bpy.data.objects.new("Sun", bpy.data.lights.new("Sun", type="SUN"))
+    sun_light.location = (0, 0, 10)
+    collection.objects.link(sun_light)
     sun_light.data.energy = 5.0  # シーンが暗い場合はさらに上げてもOK
 
     # 追加のエリアライトを正面に配置して、モンキーの形状を分かりやすくする
-    bpy.ops.object.light_add(type="AREA", location=(0, -1, 1))
-    area_light = bpy.context.active_object
+    area_light = bpy.data.objects.new("Area", bpy.data.lights.new("Area", type="AREA"))
+    area_light.location = (0, -1, 1)
+    collection.objects.link(area_light)
     area_light.data.energy = 50.0
     area_light.data.size = 2.0
 
@@ -93,9 +115,13 @@ def setup_render(output_filepath: str) -> None:
         output_filepath: レンダリング結果の出力先ファイルパス
     """
     scene = bpy.context.scene
-    # 高速レンダリングのため Eevee を使用
-    scene.render.engine = "BLENDER_EEVEE"
+    # 高速レンダリングのため Eevee を使用（ディスプレイがなければ Cycles の CPU レンダリング）
+    select_eevee(scene)
     scene.render.image_settings.file_format = "PNG"
+    # 不透明な確認用の画像なので、アルファなしの 8 ビット RGB で書き出す（16 ビットや RGBA にしない）
+    scene.render.image_settings.color_mode = "RGB"
+    scene.render.image_settings.color_depth = "8"
+    scene.render.image_settings.compression = 15
     scene.render.filepath = output_filepath
     # 解像度は高速レンダリングを考慮して控えめに設定
     scene.render.resolution_x = 800
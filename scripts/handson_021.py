@@ -11,8 +11,12 @@ Blender 4.0.2 用スクリプト
 
 import bpy
 import os
-import shutil
-from datetime import datetime
+import sys
+import time
+
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import select_eevee  # pylint: disable=wrong-import-position
 
 
 def cleanup_scene() -> None:
@@ -22,9 +26,10 @@ def cleanup_scene() -> None:
 
 
 def shade_smooth(obj: bpy.types.Object) -> None:
-    """指定オブジェクトをスムーズシェード化"""
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.shade_smooth()
+    """指定オブジェクトをスムーズシェード化（オペレーターを使わず、全ポリゴンのフラグを一括で書き込む）"""
+    polygons = obj.data.polygons
+    polygons.foreach_set("use_smooth", [True] * len(polygons))
+    obj.data.update()
 
 
 def create_water_plane() -> bpy.types.Object:
@@ -42,9 +47,8 @@ def create_water_plane() -> bpy.types.Object:
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
 
-    # 既定ノードを全削除
-    for node in list(nodes):
-        nodes.remove(node)
+    # 既定ノードを全削除（1 ノードずつ remove せず一括で）
+    nodes.clear()
 
     # 必要なノードを作成
     output_node = nodes.new(type="ShaderNodeOutputMaterial")
@@ -105,17 +109,19 @@ def create_sphere() -> bpy.types.Object:
 
 def create_camera() -> bpy.types.Object:
     """シーンを撮影するカメラを作成する"""
-    bpy.ops.object.camera_add(location=(5, -5, 5), rotation=(1.1, 0, 0.7854))
-    camera = bpy.context.active_object
-    camera.name = "Camera"
+    camera = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    camera.location = (5, -5, 5)
+    camera.rotation_euler = (1.1, 0, 0.7854)
+    bpy.context.collection.objects.link(camera)
     bpy.context.scene.camera = camera
     return camera
 
 
 def create_light() -> bpy.types.Object:
     """シーン照明用のSunランプを作成する"""
-    bpy.ops.object.light_add(type="SUN", location=(0, 0, 10))
-    light = bpy.context.active_object
+    light = bpy.data.objects.new("Sun", bpy.data.lights.new("Sun", type="SUN"))
+    light.location = (0, 0, 10)
+    bpy.context.collection.objects.link(light)
     # 少し強めに
     light.data.energy = 5.0
     # 角度を少し大きめにして影を柔らかく
@@ -126,8 +132,13 @@ def create_light() -> bpy.types.Object:
 def setup_render(output_filepath: str) -> None:
     """レンダリング設定を行い、出力先を指定する"""
     scene = bpy.context.scene
-    scene.render.engine = "BLENDER_EEVEE"
+    # Eevee で短時間レンダリング（ディスプレイがなければ Cycles の CPU レンダリング）
+    select_eevee(scene)
     scene.render.image_settings.file_format = "PNG"
+    # 不透明な確認用の画像なので、アルファなしの 8 ビット RGB で書き出す（16 ビットや RGBA にしない）
+    scene.render.image_settings.color_mode = "RGB"
+    scene.render.image_settings.color_depth = "8"
+    scene.render.image_settings.compression = 15
     scene.render.resolution_x = 640
     scene.render.resolution_y = 480
     scene.render.resolution_percentage = 100
@@ -139,10 +150,13 @@ def setup_render(output_filepath: str) -> None:
 
 def backup_existing_file(filepath: str) -> None:
     """出力先ファイルが存在する場合、タイムスタンプ付きで退避する"""
-    if os.path.exists(filepath):
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        backup_filepath = f"{filepath}.{timestamp}.bak"
-        shutil.move(filepath, backup_filepath)
+    timestamp = int(time.time())
+    backup_filepath = f"{filepath}.{timestamp}.bak"
+    # 事前の存在確認はせず、リネーム 1 回で退避する（ファイルがなければ何もしない）
+    try:
+        os.replace(filepath, backup_filepath)
+    except FileNotFoundError:
+        pass
 
 
 def main() -> None:
@@ -1,10 +1,17 @@
+import bmesh
 import bpy
+import numpy as np
 import os
 import shutil
-from math import pi
-from random import uniform
+import sys
+from mathutils import Matrix
 import time
 
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _matlib import principled_material  # pylint: disable=wrong-import-position
+from _util import enable_best_gpu, setup_denoised_sampling  # pylint: disable=wrong-import-position
+
 # 実行時間計測用
 start_time = time.time()
 
@@ -25,35 +32,69 @@ bpy.ops.object.select_all(action="SELECT")
 bpy.ops.object.delete()
 
 
-# ローポリ円柱（ミニタワー）の作成
-def create_mini_tower(location):
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=8, radius=0.5, depth=3.0, location=location  # 8面のローポリ
+# ローポリ円柱（ミニタワー）のメッシュを 1 つだけ作成し、全タワーで共有する
+# （オペレーターを 100 回呼ぶとそのたびにシーン更新と選択状態の同期が走るため、データ API で直接作る）
+def create_tower_mesh():
+    mesh = bpy.data.meshes.new("TowerMesh")
+    bm = bmesh.new()
+    bmesh.ops.create_cone(
+        bm, cap_ends=True, segments=8, radius1=0.5, radius2=0.5, depth=3.0  # 8面のローポリ
+    )
+    bm.to_mesh(mesh)
+    bm.free()
+    # マテリアルも共有メッシュに 1 つだけ割り当て、全タワーで同じシェーダーを使う
+    mesh.materials.append(
+        principled_material("TowerMaterial", {"Base Color": (0.8, 0.8, 0.8, 1.0), "Roughness": 0.5})
     )
-    tower = bpy.context.active_object
+    return mesh
+
+
+def create_tower_matrices():
+    """
+    10x10 のグリッド上のタワーの変換行列（位置＋Z 軸まわりのランダムな回転）を NumPy でまとめて求める
+    """
+    # 2単位間隔で配置
+    xs, ys = np.meshgrid(np.arange(-5, 5) * 2.0, np.arange(-5, 5) * 2.0, indexing="ij")
     # 少しランダムに回転
-    tower.rotation_euler[2] = uniform(0, 2 * pi)
+    angles = np.random.default_rng().uniform(0, 2 * np.pi, xs.size)
+    cos, sin = np.cos(angles), np.sin(angles)
+
+    matrices = np.zeros((xs.size, 4, 4))
+    matrices[:, 0, 0] = cos
+    matrices[:, 0, 1] = -sin
+    matrices[:, 1, 0] = sin
+    matrices[:, 1, 1] = cos
+    matrices[:, 2, 2] = 1.0
+    matrices[:, 3, 3] = 1.0
+    matrices[:, 0, 3] = xs.ravel()
+    matrices[:, 1, 3] = ys.ravel()
+    return matrices
+
+
+def create_mini_tower(mesh, matrix):
+    tower = bpy.data.objects.new("Tower", mesh)
+    tower.matrix_basis = Matrix(matrix.tolist())
+    bpy.context.collection.objects.link(tower)
     return tower
 
 
 # ミニタワーを10x10のグリッドに配置（合計100個）
-towers = []
-for x in range(-5, 5):
-    for y in range(-5, 5):
-        loc = (x * 2, y * 2, 0)  # 2単位間隔で配置
-        tower = create_mini_tower(loc)
-        towers.append(tower)
+# （すべての変換行列を先に求めておき、オブジェクトには行列を 1 回代入するだけにする）
+tower_mesh = create_tower_mesh()
+towers = [create_mini_tower(tower_mesh, matrix) for matrix in create_tower_matrices()]
 
 # カメラの設定
-bpy.ops.object.camera_add(location=(15, -15, 10))
-camera = bpy.context.active_object
+camera = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+camera.location = (15, -15, 10)
 camera.rotation_euler = (1.0, 0, 0.8)  # 斜め上から見下ろす角度
+bpy.context.collection.objects.link(camera)
 bpy.context.scene.camera = camera
 
 # 簡易照明の追加
-bpy.ops.object.light_add(type="SUN", location=(10, 10, 10))
-light = bpy.context.active_object
+light = bpy.data.objects.new("Sun", bpy.data.lights.new("Sun", type="SUN"))
+light.location = (10, 10, 10)
 light.data.energy = 2.0
+bpy.context.collection.objects.link(light)
 
 # レンダリング設定
 scene = bpy.context.scene
@@ -61,7 +102,13 @@ scene.render.engine = "CYCLES"  # より高质量なレンダリング
 scene.render.resolution_x = 800
 scene.render.resolution_y = 600
 scene.render.filepath = render_output
-scene.cycles.samples = 32  # 高速レンダリング用にサンプル数を低めに
+# GPU があれば GPU でレンダリング（見つからなければ CPU のまま）
+backend = enable_best_gpu()
+if backend:
+    # GPU では大きなタイルでカーネル起動やデノイズの準備のオーバーヘッドを減らす
+    scene.cycles.tile_size = 2048
+# 高速レンダリング用にサンプル数を低めにし、単色のタワーはアダプティブサンプリングで早めに打ち切る
+setup_denoised_sampling(scene, samples=32, adaptive_threshold=0.05, backend=backend)
 
 # レンダリング実行
 bpy.ops.render.render(write_still=True)
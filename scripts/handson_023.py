@@ -20,14 +20,19 @@ Blender用スクリプト:
 """
 
 import bpy
+import contextlib
 import os
-import shutil
-import datetime
 import math
 import bmesh
 import mathutils
+import sys
+import time
 import addon_utils  # アドオン有効化用
 
+# 同じディレクトリの補助モジュールを読み込めるようにする
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import select_eevee  # pylint: disable=wrong-import-position
+
 # =============================================================================
 # 1. 設定パラメータクラス
 # =============================================================================
@@ -40,7 +45,9 @@ class Config:
         self.resolution_x = 1920
         self.resolution_y = 1080
         self.resolution_percentage = 100
-        self.samples = 32
+        # BLENDER_QUALITY=final で本番品質、既定（preview）はサンプル数を抑えた確認用
+        self.quality = os.environ.get("BLENDER_QUALITY", "preview")
+        self.samples = 16 if self.quality == "preview" else 32
 
         # Ambient Occlusion（EEVEE用）
         self.use_ambient_occlusion = True
@@ -110,8 +117,15 @@ class Config:
         self.bottom_location = (0.0, 0.0, self.bottom_depth / 2.0)
         self.bottom_material_color = (0.7, 0.2, 0.2, 1.0)
 
+        # 動かないオブジェクトのモディファイア（細分化・ソリッド化・ベベルなど）を
+        # 評価済みメッシュに焼き込み、レンダリングのたびに評価し直さない
+        self.bake_static_geometry = True
+
         # コンポジター設定
         self.use_compositor = True
+        # コンポジターの Glare（FOG_GLOW）はレンダリング後に CPU でフル解像度を処理するため重い。
+        # 既定では無効にし、従来 EEVEE ではレンダリング中のブルームで代用する
+        self.use_compositor_glare = False
         self.compositor_bloom_intensity = 0.2
         self.compositor_glare_threshold = 0.8
 
@@ -124,24 +138,31 @@ config = Config()
 
 
 def backup_file(file_path: str) -> None:
-    if os.path.exists(file_path):
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        backup_path = f"{file_path}.{timestamp}.bak"
-        shutil.move(file_path, backup_path)
+    timestamp = int(time.time())
+    backup_path = f"{file_path}.{timestamp}.bak"
+    # 事前の存在確認はせず、リネーム 1 回で退避する（ファイルがなければ何もしない）
+    try:
+        os.replace(file_path, backup_path)
+    except FileNotFoundError:
+        pass
+
+
+@contextlib.contextmanager
+def deferred_scene_updates():
+    # シーン構築の終わりにビューレイヤーを 1 回だけ更新し、bpy.data で直接変更した内容を
+    # まとめて依存グラフに反映させる（--background では Undo は最初から無効なので Undo の設定には触れない）
+    try:
+        yield
+    finally:
+        bpy.context.view_layer.update()
 
 
 def clear_scene() -> None:
-    bpy.ops.object.select_all(action="SELECT")
-    bpy.ops.object.delete(use_global=False)
-    # メッシュ、マテリアル、ライト等もクリーンアップ
-    for block in bpy.data.meshes:
-        bpy.data.meshes.remove(block)
-    for block in bpy.data.materials:
-        if block.users == 0:
-            bpy.data.materials.remove(block)
-    for block in bpy.data.lights:
-        if block.users == 0:
-            bpy.data.lights.remove(block)
+    # オペレーターを使わずにオブジェクトを直接削除
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
+    # メッシュ、マテリアル、ライト等のうち参照されなくなったものを 1 回の呼び出しでまとめて削除
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
 
 
 # =============================================================================
@@ -150,47 +171,61 @@ def clear_scene() -> None:
 
 
 def setup_world_background() -> None:
+    # 背景色と環境テクスチャを 1 つのワールドノードツリーとしてまとめて組み立てる
+    # （ノードを一通り作ってからリンクをまとめて張り、ツリーを何度も組み直さない）
     world = bpy.data.worlds["World"]
-    world.use_nodes = True
+    if not world.use_nodes:
+        world.use_nodes = True
     node_tree = world.node_tree
     nodes = node_tree.nodes
     links = node_tree.links
-    for node in nodes:
-        nodes.remove(node)
+    use_env = config.use_environment_texture and os.path.exists(
+        config.environment_texture_path
+    )
+    # 背景 → ワールド出力だけのツリーが既にあれば、組み直さずに値だけ更新する
+    # （ノードを作り直すとワールドのシェーダーが再コンパイルされる）
+    bg_node = nodes.get("Background")
+    if (
+        not use_env
+        and len(nodes) == 2
+        and bg_node is not None
+        and bg_node.outputs[0].is_linked
+    ):
+        bg_node.inputs[0].default_value = config.world_background_color
+        bg_node.inputs[1].default_value = config.environment_strength
+        return
+    nodes.clear()
     bg_node = nodes.new(type="ShaderNodeBackground")
-    bg_node.location = (-300, 0)
+    bg_node.location = (-300, -200)
     bg_node.inputs[0].default_value = config.world_background_color
     bg_node.inputs[1].default_value = config.environment_strength
     output_node = nodes.new(type="ShaderNodeOutputWorld")
-    output_node.location = (0, 0)
-    links.new(bg_node.outputs[0], output_node.inputs[0])
-
-
-def setup_environment_texture() -> None:
-    if config.use_environment_texture and os.path.exists(
-        config.environment_texture_path
+    output_node.location = (100, 0)
+    if not use_env:
+        links.new(bg_node.outputs[0], output_node.inputs[0])
+        return
+
+    env_tex = nodes.new(type="ShaderNodeTexEnvironment")
+    env_tex.location = (-600, 100)
+    try:
+        # 同じパスの画像が読み込み済みなら、HDR をデコードし直さずにそれを使う
+        env_tex.image = bpy.data.images.load(
+            config.environment_texture_path, check_existing=True
+        )
+    except Exception as e:
+        print("環境テクスチャの読み込みエラー: ", e)
+    env_bg_node = nodes.new(type="ShaderNodeBackground")
+    env_bg_node.location = (-300, 100)
+    env_bg_node.inputs[1].default_value = config.environment_strength
+    mix_node = nodes.new(type="ShaderNodeMixShader")
+    mix_node.location = (-100, 0)
+    for from_socket, to_socket in (
+        (env_tex.outputs[0], env_bg_node.inputs[0]),
+        (env_bg_node.outputs[0], mix_node.inputs[1]),
+        (bg_node.outputs[0], mix_node.inputs[2]),
+        (mix_node.outputs[0], output_node.inputs[0]),
     ):
-        world = bpy.data.worlds["World"]
-        world.use_nodes = True
-        nt = world.node_tree
-        nodes = nt.nodes
-        links = nt.links
-        env_tex = nodes.new(type="ShaderNodeTexEnvironment")
-        env_tex.location = (-600, 0)
-        try:
-            env_tex.image = bpy.data.images.load(config.environment_texture_path)
-        except Exception as e:
-            print("環境テクスチャの読み込みエラー: ", e)
-        mix_node = nodes.new(type="ShaderNodeMixShader")
-        mix_node.location = (-150, 0)
-        bg_node = nodes.new(type="ShaderNodeBackground")
-        bg_node.location = (-300, -200)
-        bg_node.inputs[0].default_value = config.world_background_color
-        output_node = nodes.new(type="ShaderNodeOutputWorld")
-        output_node.location = (100, 0)
-        links.new(env_tex.outputs[0], mix_node.inputs[1])
-        links.new(bg_node.outputs[0], mix_node.inputs[2])
-        links.new(mix_node.outputs[0], output_node.inputs[0])
+        links.new(from_socket, to_socket)
 
 
 def setup_ambient_occlusion() -> None:
@@ -207,23 +242,36 @@ def setup_ambient_occlusion() -> None:
 
 def setup_render() -> None:
     scene = bpy.context.scene
-    scene.render.engine = config.render_engine
+    if config.render_engine == "BLENDER_EEVEE":
+        # ディスプレイがなければ Cycles の CPU レンダリングに切り替わる
+        use_eevee = select_eevee(scene, fallback_samples=config.samples)
+    else:
+        scene.render.engine = config.render_engine
+        use_eevee = False
     scene.render.resolution_x = config.resolution_x
     scene.render.resolution_y = config.resolution_y
     scene.render.resolution_percentage = config.resolution_percentage
     scene.render.filepath = config.output_filepath
     scene.render.image_settings.file_format = "PNG"
-    if config.render_engine == "BLENDER_EEVEE":
+    # 不透明な確認用の画像なので、アルファなしの 8 ビット RGB で書き出す（16 ビットや RGBA にしない）
+    scene.render.image_settings.color_mode = "RGB"
+    scene.render.image_settings.color_depth = "8"
+    scene.render.image_settings.compression = 15
+    if config.quality == "preview":
+        scene.render.use_motion_blur = False
+    if use_eevee:
         scene.eevee.taa_render_samples = config.samples
-        scene.eevee.use_bloom = True
+        # 従来 EEVEE のみの設定（EEVEE Next ではブルームはコンポジターで行う）
+        if hasattr(scene.eevee, "use_bloom"):
+            scene.eevee.use_bloom = True
+            scene.eevee.bloom_intensity = config.compositor_bloom_intensity
 
 
 def setup_compositor() -> None:
     scene = bpy.context.scene
     scene.use_nodes = True
     tree = scene.node_tree
-    for node in tree.nodes:
-        tree.nodes.remove(node)
+    tree.nodes.clear()
     render_layers = tree.nodes.new(type="CompositorNodeRLayers")
     render_layers.location = (-300, 0)
     glare_node = tree.nodes.new(type="CompositorNodeGlare")
@@ -244,8 +292,9 @@ def setup_compositor() -> None:
 
 
 def create_camera() -> bpy.types.Object:
-    bpy.ops.object.camera_add(location=config.camera_location)
-    cam = bpy.context.active_object
+    cam = bpy.data.objects.new("Camera", bpy.data.cameras.new("Camera"))
+    cam.location = config.camera_location
+    bpy.context.collection.objects.link(cam)
     cam.data.lens = config.camera_lens
     cam.data.sensor_width = config.camera_sensor_width
     return cam
@@ -280,24 +329,27 @@ def setup_camera_and_animate() -> None:
 
 
 def create_sun_light() -> bpy.types.Object:
-    bpy.ops.object.light_add(type="SUN", location=config.sun_light_location)
-    sun = bpy.context.active_object
+    sun = bpy.data.objects.new("Sun", bpy.data.lights.new("Sun", type="SUN"))
+    sun.location = config.sun_light_location
+    bpy.context.collection.objects.link(sun)
     sun.data.energy = config.sun_light_energy
     sun.data.angle = math.radians(5)
     return sun
 
 
 def create_area_light() -> bpy.types.Object:
-    bpy.ops.object.light_add(type="AREA", location=config.area_light_location)
-    area = bpy.context.active_object
+    area = bpy.data.objects.new("Area", bpy.data.lights.new("Area", type="AREA"))
+    area.location = config.area_light_location
+    bpy.context.collection.objects.link(area)
     area.data.energy = config.area_light_energy
     area.data.size = 5.0
     return area
 
 
 def create_point_light() -> bpy.types.Object:
-    bpy.ops.object.light_add(type="POINT", location=config.point_light_location)
-    point = bpy.context.active_object
+    point = bpy.data.objects.new("Point", bpy.data.lights.new("Point", type="POINT"))
+    point.location = config.point_light_location
+    bpy.context.collection.objects.link(point)
     point.data.energy = config.point_light_energy
     return point
 
@@ -333,8 +385,7 @@ def create_material_complex(
     nt = mat.node_tree
     nodes = nt.nodes
     links = nt.links
-    for node in nodes:
-        nodes.remove(node)
+    nodes.clear()
     output_node = nodes.new(type="ShaderNodeOutputMaterial")
     output_node.location = (400, 0)
     mix_shader = nodes.new(type="ShaderNodeMixShader")
@@ -358,10 +409,16 @@ def setup_material_for_object(
     use_complex: bool = False,
     color: tuple[float, float, float, float] = (1, 1, 1, 1),
 ) -> None:
-    if use_complex:
-        mat = create_material_complex(obj.name + "_Mat", color)
-    else:
-        mat = create_material_simple(obj.name + "_Mat", color)
+    # 種類と色から決まる名前にして、同じ組み合わせのマテリアルは複数のパーツで共有する
+    # （ノードツリーとシェーダーのコンパイルが組み合わせごとに 1 回で済む）
+    kind = "Complex" if use_complex else "Simple"
+    name = f"{kind}Mat_" + "".join(f"{round(c * 255):02x}" for c in color)
+    mat = bpy.data.materials.get(name)
+    if mat is None:
+        if use_complex:
+            mat = create_material_complex(name, color)
+        else:
+            mat = create_material_simple(name, color)
     if obj.data is not None:
         obj.data.materials.clear()
         obj.data.materials.append(mat)
@@ -373,16 +430,24 @@ def setup_material_for_object(
 
 
 def create_ground_plane() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_plane_add(
-        size=config.ground_size, location=config.ground_location
+    # 4 頂点 1 面だけなので、オペレーターや bmesh を使わずに頂点と面から直接作る
+    half = config.ground_size / 2.0
+    mesh = bpy.data.meshes.new("Ground")
+    mesh.from_pydata(
+        [(-half, -half, 0.0), (half, -half, 0.0), (half, half, 0.0), (-half, half, 0.0)],
+        [],
+        [(0, 1, 2, 3)],
     )
-    ground = bpy.context.active_object
+    mesh.polygons.foreach_set("use_smooth", [True])
+    mesh.update()
+    ground = bpy.data.objects.new("Ground", mesh)
+    ground.location = config.ground_location
+    bpy.context.collection.objects.link(ground)
     setup_material_for_object(
         ground, use_complex=True, color=config.ground_material_color
     )
     subd = ground.modifiers.new("Subdiv", type="SUBSURF")
     subd.levels = 2
-    bpy.ops.object.shade_smooth()
     return ground
 
 
@@ -391,77 +456,93 @@ def create_ground_plane() -> bpy.types.Object:
 # =============================================================================
 
 
+def make_object(
+    name: str,
+    bm: bmesh.types.BMesh,
+    location: tuple[float, float, float] = (0.0, 0.0, 0.0),
+    smooth: bool = True,
+) -> bpy.types.Object:
+    # bmesh をメッシュに書き出してオブジェクトを作り、シーンにリンクする
+    # （primitive_*_add のようなオペレーターの呼び出し・選択状態の同期・Undo 登録を行わない）
+    for face in bm.faces:
+        face.smooth = smooth
+    mesh = bpy.data.meshes.new(name)
+    bm.to_mesh(mesh)
+    bm.free()
+    obj = bpy.data.objects.new(name, mesh)
+    obj.location = location
+    bpy.context.collection.objects.link(obj)
+    return obj
+
+
+def create_cylinder_object(
+    name: str, radius: float, depth: float, location: tuple[float, float, float]
+) -> bpy.types.Object:
+    bm = bmesh.new()
+    bmesh.ops.create_cone(
+        bm,
+        cap_ends=True,
+        cap_tris=False,
+        segments=64,
+        radius1=radius,
+        radius2=radius,
+        depth=depth,
+    )
+    return make_object(name, bm, location)
+
+
 def create_totem_base() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=64,
-        radius=config.base_radius,
-        depth=config.base_depth,
-        location=config.base_location,
+    base = create_cylinder_object(
+        "TotemBase", config.base_radius, config.base_depth, config.base_location
     )
-    base = bpy.context.active_object
     setup_material_for_object(base, use_complex=True, color=config.base_material_color)
-    bpy.ops.object.shade_smooth()
     return base
 
 
 def create_bird_head() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=64,
-        radius=config.head_radius,
-        depth=config.head_depth,
-        location=config.head_location,
+    head = create_cylinder_object(
+        "BirdHead", config.head_radius, config.head_depth, config.head_location
     )
-    head = bpy.context.active_object
     setup_material_for_object(head, use_complex=True, color=config.head_material_color)
-    bpy.ops.object.shade_smooth()
     return head
 
 
 def create_beak() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_cube_add(
-        size=config.beak_size, location=config.beak_location
+    bm = bmesh.new()
+    bmesh.ops.create_cube(bm, size=config.beak_size)
+    # +Y 側（中心の Y が最大）の面を押し出す
+    target_face = max(bm.faces, key=lambda face: face.calc_center_median().y)
+    extruded = bmesh.ops.extrude_face_region(bm, geom=[target_face])
+    bmesh.ops.translate(
+        bm,
+        vec=config.beak_extrude_vector,
+        verts=[elem for elem in extruded["geom"] if isinstance(elem, bmesh.types.BMVert)],
     )
-    beak = bpy.context.active_object
+    # 押し出し元の面が内部に残っていれば削除する（extrude_region_move と同じ形状にする）
+    if target_face.is_valid:
+        bmesh.ops.delete(bm, geom=[target_face], context="FACES_ONLY")
+    beak = make_object("Beak", bm, config.beak_location, smooth=False)
     setup_material_for_object(beak, use_complex=False, color=config.beak_material_color)
-    bpy.ops.object.mode_set(mode="EDIT")
-    mesh = beak.data
-    bm = bmesh.from_edit_mesh(mesh)
-    max_y = -1e6
-    target_face = None
-    for face in bm.faces:
-        center = face.calc_center_median()
-        if center.y > max_y:
-            max_y = center.y
-            target_face = face
-    if target_face is not None:
-        for face in bm.faces:
-            face.select = False
-        target_face.select = True
-        bmesh.update_edit_mesh(mesh)
-        bpy.ops.mesh.extrude_region_move(
-            TRANSFORM_OT_translate={"value": config.beak_extrude_vector}
-        )
-    bpy.ops.object.mode_set(mode="OBJECT")
     return beak
 
 
 def create_left_wing() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_plane_add(
-        size=config.wing_size, location=config.left_wing_location
-    )
-    left_wing = bpy.context.active_object
+    bm = bmesh.new()
+    # primitive_plane_add と同じく、size は一辺の長さ（create_grid には半分を渡す）
+    bmesh.ops.create_grid(bm, x_segments=1, y_segments=1, size=config.wing_size / 2.0)
+    left_wing = make_object("LeftWing", bm, config.left_wing_location)
     left_wing.rotation_euler = config.left_wing_rotation
     left_wing.scale = config.left_wing_scale
     setup_material_for_object(
         left_wing, use_complex=False, color=config.wing_material_color
     )
-    bpy.ops.object.shade_smooth()
     return left_wing
 
 
 def create_right_wing(left_wing: bpy.types.Object) -> bpy.types.Object:
+    # Object.copy() はメッシュを共有したまま複製する。左右の違いはオブジェクトの
+    # 拡大率（X 反転）だけなので、メッシュは複製せずに左翼と共有する
     right_wing = left_wing.copy()
-    right_wing.data = left_wing.data.copy()
     bpy.context.scene.collection.objects.link(right_wing)
     right_wing.location = config.left_wing_location
     right_wing.scale = (
@@ -473,32 +554,22 @@ def create_right_wing(left_wing: bpy.types.Object) -> bpy.types.Object:
 
 
 def create_mid_face() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=64,
-        radius=config.mid_face_radius,
-        depth=config.mid_face_depth,
-        location=config.mid_face_location,
+    mid_face = create_cylinder_object(
+        "MidFace", config.mid_face_radius, config.mid_face_depth, config.mid_face_location
     )
-    mid_face = bpy.context.active_object
     setup_material_for_object(
         mid_face, use_complex=True, color=config.mid_face_material_color
     )
-    bpy.ops.object.shade_smooth()
     return mid_face
 
 
 def create_bottom_figure() -> bpy.types.Object:
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=64,
-        radius=config.bottom_radius,
-        depth=config.bottom_depth,
-        location=config.bottom_location,
+    bottom = create_cylinder_object(
+        "BottomFigure", config.bottom_radius, config.bottom_depth, config.bottom_location
     )
-    bottom = bpy.context.active_object
     setup_material_for_object(
         bottom, use_complex=True, color=config.bottom_material_color
     )
-    bpy.ops.object.shade_smooth()
     return bottom
 
 
@@ -528,20 +599,58 @@ def assemble_totem_pole() -> bpy.types.Object:
 # =============================================================================
 
 
+def is_identity_matrix(matrix: mathutils.Matrix, eps: float = 1e-6) -> bool:
+    return all(
+        abs(matrix[i][j] - (1.0 if i == j else 0.0)) < eps
+        for i in range(4)
+        for j in range(4)
+    )
+
+
 def apply_transformations(obj: bpy.types.Object) -> None:
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.transform_apply(location=True, rotation=True, scale=True)
+    # transform_apply は選択中のオブジェクトにしか効かず、ここで作るオブジェクトは未選択なので、
+    # 変換をメッシュデータへ直接書き込む
+    # （シーン更新を遅延している間は matrix_world が古いため matrix_basis を使う）
+    matrix = obj.matrix_basis.copy()
+    # 変換が単位行列なら適用しても頂点は変わらないので、メッシュの書き換えを省く
+    if is_identity_matrix(matrix):
+        return
+    obj.data.transform(matrix)
+    # 子オブジェクトの見た目の位置が変わらないよう、親の変換を親逆行列へ移す
+    for child in obj.children:
+        child.matrix_parent_inverse = matrix @ child.matrix_parent_inverse
+    obj.matrix_basis = mathutils.Matrix.Identity(4)
 
 
 def set_object_origin_to_geometry(obj: bpy.types.Object) -> None:
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.origin_set(type="ORIGIN_GEOMETRY", center="BOUNDS")
+    # origin_set(type="ORIGIN_GEOMETRY", center="BOUNDS") と同じく、原点をバウンディングボックスの
+    # 中心へ移す（オペレーターは選択中のオブジェクトにしか効かないため、データを直接書き換える）
+    coords = [vertex.co for vertex in obj.data.vertices]
+    if not coords:
+        return
+    center = mathutils.Vector(
+        (min(co[i] for co in coords) + max(co[i] for co in coords)) / 2.0 for i in range(3)
+    )
+    if center.length_squared == 0.0:
+        return
+    obj.data.transform(mathutils.Matrix.Translation(-center))
+    obj.matrix_basis = obj.matrix_basis @ mathutils.Matrix.Translation(center)
+    for child in obj.children:
+        child.matrix_parent_inverse = (
+            mathutils.Matrix.Translation(-center) @ child.matrix_parent_inverse
+        )
+
+
+def shade_smooth_mesh(mesh: bpy.types.Mesh) -> None:
+    # shade_smooth オペレーターの代わりに、全ポリゴンのスムーズフラグを一括で書き込む
+    mesh.polygons.foreach_set("use_smooth", [True] * len(mesh.polygons))
+    mesh.update()
 
 
 def add_subdivision_modifier(obj: bpy.types.Object, levels: int = 2) -> None:
     mod = obj.modifiers.new("Subdivision", type="SUBSURF")
     mod.levels = levels
-    bpy.ops.object.shade_smooth()
+    shade_smooth_mesh(obj.data)
 
 
 def add_edge_split_modifier(
@@ -552,10 +661,12 @@ def add_edge_split_modifier(
 
 
 def recalc_normals(obj: bpy.types.Object) -> None:
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.mode_set(mode="EDIT")
-    bpy.ops.mesh.normals_make_consistent(inside=False)
-    bpy.ops.object.mode_set(mode="OBJECT")
+    # 編集モードに切り替えず、オブジェクトのメッシュデータに直接 bmesh で面の向きを揃える
+    bm = bmesh.new()
+    bm.from_mesh(obj.data)
+    bmesh.ops.recalc_face_normals(bm, faces=bm.faces)
+    bm.to_mesh(obj.data)
+    bm.free()
 
 
 def refine_mesh(obj: bpy.types.Object) -> None:
@@ -581,8 +692,7 @@ def create_procedural_material(name: str) -> bpy.types.Material:
     nt = mat.node_tree
     nodes = nt.nodes
     links = nt.links
-    for node in nodes:
-        nodes.remove(node)
+    nodes.clear()
     output_node = nodes.new(type="ShaderNodeOutputMaterial")
     output_node.location = (800, 0)
     bsdf = nodes.new(type="ShaderNodeBsdfPrincipled")
@@ -597,13 +707,11 @@ def create_procedural_material(name: str) -> bpy.types.Material:
     ramp.location = (300, 200)
     ramp.color_ramp.elements[0].position = 0.3
     ramp.color_ramp.elements[1].position = 0.7
-    mapping = nodes.new(type="ShaderNodeMapping")
-    mapping.location = (-200, 200)
-    mapping.inputs["Scale"].default_value = (1.0, 1.0, 1.0)
+    # 拡大率 1 の Mapping は恒等変換なので挟まず、オブジェクト座標をそのままノイズに渡す
+    # （シェーディング点ごとの行列演算を省く）
     tex_coord = nodes.new(type="ShaderNodeTexCoord")
-    tex_coord.location = (-400, 200)
-    links.new(tex_coord.outputs["Object"], mapping.inputs["Vector"])
-    links.new(mapping.outputs["Vector"], noise.inputs["Vector"])
+    tex_coord.location = (-200, 200)
+    links.new(tex_coord.outputs["Object"], noise.inputs["Vector"])
     links.new(noise.outputs["Fac"], ramp.inputs["Fac"])
     links.new(ramp.outputs["Color"], bsdf.inputs["Base Color"])
     links.new(bsdf.outputs["BSDF"], output_node.inputs["Surface"])
@@ -618,8 +726,7 @@ def create_custom_material(
     nt = mat.node_tree
     nodes = nt.nodes
     links = nt.links
-    for node in nodes:
-        nodes.remove(node)
+    nodes.clear()
     out_node = nodes.new(type="ShaderNodeOutputMaterial")
     out_node.location = (900, 0)
     mix_shader = nodes.new(type="ShaderNodeMixShader")
@@ -642,7 +749,11 @@ def create_custom_material(
 
 
 def assign_procedural_material(obj: bpy.types.Object) -> None:
-    mat = create_procedural_material(obj.name + "_ProcMat")
+    # ノード構成もパラメータも全オブジェクト共通なので、1 つのマテリアルを共有して
+    # シェーダーのコンパイルをオブジェクト数に関係なく 1 回にする
+    mat = bpy.data.materials.get("SharedProcMat")
+    if mat is None:
+        mat = create_procedural_material("SharedProcMat")
     if obj.data is not None:
         obj.data.materials.clear()
         obj.data.materials.append(mat)
@@ -654,8 +765,7 @@ def assign_procedural_material(obj: bpy.types.Object) -> None:
 
 
 def smooth_object(obj: bpy.types.Object) -> None:
-    bpy.context.view_layer.objects.active = obj
-    bpy.ops.object.shade_smooth()
+    shade_smooth_mesh(obj.data)
 
 
 def add_custom_modifier(obj: bpy.types.Object) -> None:
@@ -672,6 +782,15 @@ def setup_object_for_render(obj: bpy.types.Object) -> None:
     refine_mesh(obj)
     add_custom_modifier(obj)
     smooth_object(obj)
+    if config.bake_static_geometry:
+        bake_modifiers(obj)
+
+
+def bake_modifiers(obj: bpy.types.Object) -> None:
+    # モディファイアを評価した結果のメッシュに差し替え、モディファイアスタックを空にする
+    depsgraph = bpy.context.evaluated_depsgraph_get()
+    obj.data = bpy.data.meshes.new_from_object(obj.evaluated_get(depsgraph))
+    obj.modifiers.clear()
 
 
 # =============================================================================
@@ -721,25 +840,27 @@ def export_and_finalize() -> None:
 
 
 def full_main() -> None:
-    clear_scene()
-    setup_world_background()
-    setup_environment_texture()
-    setup_ambient_occlusion()
-    setup_render()
-    if config.use_compositor:
-        setup_compositor()
-    setup_camera_and_animate()
-    setup_all_lights()
-    ground = create_ground_plane()
-    setup_object_for_render(ground)
-    totem = assemble_totem_pole()
-    setup_object_for_render(totem)
-    bpy.ops.object.select_all(action="DESELECT")
-    ground.select_set(True)
-    totem.select_set(True)
-    bpy.ops.view3d.camera_to_view_selected()
-    assign_procedural_material(ground)
-    assign_procedural_material(totem)
+    with deferred_scene_updates():
+        clear_scene()
+        setup_world_background()
+        setup_ambient_occlusion()
+        setup_render()
+        if config.use_compositor and config.use_compositor_glare:
+            setup_compositor()
+        setup_camera_and_animate()
+        setup_all_lights()
+        ground = create_ground_plane()
+        setup_object_for_render(ground)
+        totem = assemble_totem_pole()
+        setup_object_for_render(totem)
+        # 選択中のオブジェクトだけを直接選択解除する（select_all オペレーターを使わない）
+        for obj in list(bpy.context.selected_objects):
+            obj.select_set(False)
+        ground.select_set(True)
+        totem.select_set(True)
+        bpy.ops.view3d.camera_to_view_selected()
+        assign_procedural_material(ground)
+        assign_procedural_material(totem)
     if not os.path.exists(config.output_dir):
         os.makedirs(config.output_dir)
     backup_file(config.output_filepath)
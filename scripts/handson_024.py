@@ -10,11 +10,11 @@ Blender 4.3.2 用バックグラウンド実行スクリプト。
 
 import bpy
 import bmesh
-import math
 import os
 import shutil
 import datetime
 import mathutils
+import numpy as np
 
 
 def main() -> None:
@@ -30,28 +30,30 @@ def main() -> None:
     print("環境設定完了")
 
     # 円柱の作成 (32頂点, 半径1, 深さ2)
-    bpy.ops.mesh.primitive_cylinder_add(
-        vertices=32,
-        radius=1,
+    # オペレーターや編集モードを使わず、bmesh 上で作成からリングカットまで行う
+    bm = bmesh.new()
+    bmesh.ops.create_cone(
+        bm,
+        cap_ends=True,  # 上下の面は NGON
+        cap_tris=False,
+        segments=32,
+        radius1=1,
+        radius2=1,
         depth=2,
-        end_fill_type='NGON',
-        location=(0, 0, 0)
     )
-    cylinder = bpy.context.active_object
-    bpy.context.view_layer.objects.active = cylinder
+    bm.normal_update()
     print("円柱の作成完了")
 
-    # 編集モードに切替え、bmeshでリングカット用に側面のみサブディビジョン
-    bpy.ops.object.mode_set(mode='EDIT')
-    bm = bmesh.from_edit_mesh(cylinder.data)
+    # リングカット用に側面のみサブディビジョン（編集モードの subdivide と同じく、側面の全辺を 3 分割）
     side_faces = [face for face in bm.faces if abs(face.normal.z) < 0.1]
-    for face in bm.faces:
-        face.select = False
-    for face in side_faces:
-        face.select = True
-    bpy.ops.mesh.subdivide(number_cuts=3, smoothness=0)
-    bmesh.update_edit_mesh(cylinder.data)
-    bpy.ops.object.mode_set(mode='OBJECT')
+    side_edges = list({edge for face in side_faces for edge in face.edges})
+    bmesh.ops.subdivide_edges(bm, edges=side_edges, cuts=3, smooth=0, use_grid_fill=True)
+
+    mesh = bpy.data.meshes.new("Cylinder")
+    bm.to_mesh(mesh)
+    bm.free()
+    cylinder = bpy.data.objects.new("Cylinder", mesh)
+    bpy.context.collection.objects.link(cylinder)
     print("リングカット追加完了")
 
     # 各頂点にサイン波で凹凸パターンを付与（上下スライド）
@@ -59,12 +61,17 @@ def main() -> None:
     height: float = 2.0
     z_bottom: float = -1.0
     z_top: float = 1.0
-    for vertex in cylinder.data.vertices:
-        if abs(vertex.co.z - z_top) < 1e-3 or abs(vertex.co.z - z_bottom) < 1e-3:
-            continue
-        factor: float = (vertex.co.z - z_bottom) / height
-        displacement: float = amplitude * math.sin(math.pi * factor)
-        vertex.co.z += displacement
+    # 全頂点の座標を NumPy 配列にまとめて取り出し、上下端以外の頂点を一括でずらす
+    vertices = cylinder.data.vertices
+    co = np.empty(len(vertices) * 3, dtype=np.float32)
+    vertices.foreach_get("co", co)
+    co = co.reshape(-1, 3)
+    z = co[:, 2]
+    inner = (np.abs(z - z_top) >= 1e-3) & (np.abs(z - z_bottom) >= 1e-3)
+    factor = (z[inner] - z_bottom) / height
+    z[inner] += amplitude * np.sin(np.pi * factor)
+    vertices.foreach_set("co", co.ravel())
+    cylinder.data.update()
     print("凹凸パターン作成完了")
 
     # マテリアルの設定 (明るめにして形状が見やすいようにする)
@@ -5,22 +5,51 @@ This script renders a scene with buildings that have random emissive windows.
 """
 
 import os
-import random
 import shutil
+import sys
 import time
 from datetime import datetime
 import bpy
-from mathutils import Vector
+import numpy as np
+
+# Make the helper modules in this directory importable
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from _util import select_eevee  # pylint: disable=wrong-import-position
+
+# BLENDER_QUALITY=final for full quality; the default (preview) keeps sample counts low
+QUALITY = os.environ.get("BLENDER_QUALITY", "preview")
+
+# Single PCG64 generator for every random draw; BLENDER_SEED picks a different (reproducible) city
+RNG = np.random.default_rng(int(os.environ.get("BLENDER_SEED", "0")))
+
+# Vertex color layer holding the window colors (read by the shared building material)
+BUILDING_COLOR_LAYER = "Col"
+
+
+def build_window_palette(size=256):
+    """Precompute candidate window colors for each category (dark, dim, lit)."""
+    palette = np.empty((3, size, 4), dtype=np.float32)
+    palette[..., 3] = 1.0
+    # Very dark color for unlit windows
+    palette[0, :, :3] = (0.02, 0.02, 0.03)
+    # Dimmer, cooler light for some variation
+    palette[1, :, :3] = RNG.uniform((0.5, 0.5, 0.7), (0.8, 0.8, 0.9), size=(size, 3))
+    # Warm light colors for lit windows
+    palette[2, :, :3] = RNG.uniform((0.9, 0.7, 0.2), (1.0, 0.9, 0.5), size=(size, 3))
+    return palette
+
+
+WINDOW_PALETTE = build_window_palette()
 
 
 def setup_environment():
     """Set up the Blender environment and clean the scene."""
-    # Clear existing objects
-    bpy.ops.object.select_all(action='SELECT')
-    bpy.ops.object.delete()
+    # Clear existing objects (removed directly instead of select_all + delete operators)
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj, do_unlink=True)
 
-    # Create world with dark sky
-    world = bpy.data.worlds.new("NightWorld")
+    # Create world with dark sky (reusing the one from a previous run if present)
+    world = bpy.data.worlds.get("NightWorld") or bpy.data.worlds.new("NightWorld")
     bpy.context.scene.world = world
     world.use_nodes = True
     bg_node = world.node_tree.nodes["Background"]
@@ -37,67 +66,60 @@ def setup_environment():
     return night_city
 
 
-def create_building(collection, location, scale):
-    """Create a building with random emissive windows."""
-    # Create building mesh
-    bpy.ops.mesh.primitive_cube_add(size=1, location=location)
-    building = bpy.context.active_object
-    building.name = f"Building_{location[0]}_{location[1]}"
-    building.scale = scale
-
-    # Move to our collection
-    old_collection = building.users_collection[0]
-    old_collection.objects.unlink(building)
-    collection.objects.link(building)
-
-    # Subdivide for windows
-    bpy.ops.object.select_all(action='DESELECT')
-    building.select_set(True)
-    bpy.context.view_layer.objects.active = building
-    bpy.ops.object.mode_set(mode='EDIT')
-    bpy.ops.mesh.subdivide(number_cuts=6)  # Increased subdivisions for more windows
-    bpy.ops.object.mode_set(mode='OBJECT')
-
-    # Enable vertex colors
-    if not building.data.vertex_colors:
-        building.data.vertex_colors.new()
-    color_layer = building.data.vertex_colors.active
-
-    # Assign random emissive colors to vertices (windows)
-    mesh = building.data
-    for poly in mesh.polygons:
-        # Only make front/side-facing polygons emissive (windows)
-        # This makes windows appear on vertical faces
-        if abs(poly.normal.z) < 0.5:  # Not top or bottom face
-            window_probability = random.random()
-            if window_probability > 0.6:  # 40% chance of a lit window
-                # Warm light colors for lit windows
-                r = random.uniform(0.9, 1.0)
-                g = random.uniform(0.7, 0.9)
-                b = random.uniform(0.2, 0.5)
-                intensity = 1.0
-            elif window_probability > 0.3:  # 30% chance of a dimly lit window
-                # Dimmer, cooler light for some variation
-                r = random.uniform(0.5, 0.8)
-                g = random.uniform(0.5, 0.8)
-                b = random.uniform(0.7, 0.9)
-                intensity = 0.7
-            else:  # 30% chance of a dark window
-                # Very dark color for unlit windows
-                r, g, b = 0.02, 0.02, 0.03
-                intensity = 0.0
-                
-            # Apply the color to all vertices of this face
-            for idx in poly.loop_indices:
-                loop = mesh.loops[idx]
-                color_layer.data[idx].color = (r, g, b, 1.0)
-        else:
-            # Building structure (non-window parts)
-            for idx in poly.loop_indices:
-                color_layer.data[idx].color = (0.05, 0.05, 0.07, 1.0)
-
-    # Create material with vertex color as emission
-    mat = bpy.data.materials.new(name=f"Building_Mat_{location[0]}_{location[1]}")
+def subdivided_cube_geometry(cuts):
+    """Return (vertices, quads) of a size-1 cube with every face cut `cuts` times per side."""
+    n = cuts + 2  # vertices along each cube edge
+    t = np.linspace(-0.5, 0.5, n)
+    u, v = (a.ravel() for a in np.meshgrid(t, t))
+    i, j = (a.ravel() for a in np.meshgrid(np.arange(n - 1), np.arange(n - 1)))
+    first = j * n + i
+    grid_quads = np.stack([first, first + 1, first + n + 1, first + n], axis=-1)
+
+    # (normal axis, normal sign, u axis, v axis), chosen so u x v points outwards
+    faces = ((0, 1, 1, 2), (0, -1, 2, 1), (1, 1, 2, 0), (1, -1, 0, 2), (2, 1, 0, 1), (2, -1, 1, 0))
+    verts = np.empty((len(faces) * n * n, 3))
+    quads = np.empty((len(faces) * len(grid_quads), 4), dtype=np.int64)
+    for k, (axis, sign, u_axis, v_axis) in enumerate(faces):
+        face_verts = verts[k * n * n:(k + 1) * n * n]
+        face_verts[:, axis] = 0.5 * sign
+        face_verts[:, u_axis] = u
+        face_verts[:, v_axis] = v
+        quads[k * len(grid_quads):(k + 1) * len(grid_quads)] = grid_quads + k * n * n
+
+    # Merge the vertices that neighbouring faces share along the cube edges
+    keys = np.rint(verts * 2 * (n - 1)).astype(np.int64)
+    _, unique_index, inverse = np.unique(keys, axis=0, return_index=True, return_inverse=True)
+    return verts[unique_index], inverse.reshape(-1)[quads]
+
+
+def build_building_template():
+    """Create the subdivided cube mesh that every building is copied from."""
+    # Build the subdivided cube directly instead of primitive_cube_add + EDIT-mode subdivide
+    verts, quads = subdivided_cube_geometry(6)  # Increased subdivisions for more windows
+    mesh = bpy.data.meshes.new("Building_Template")
+    mesh.vertices.add(len(verts))
+    mesh.vertices.foreach_set("co", verts.astype(np.float32).ravel())
+    mesh.loops.add(quads.size)
+    mesh.loops.foreach_set("vertex_index", quads.astype(np.int32).ravel())
+    mesh.polygons.add(len(quads))
+    mesh.polygons.foreach_set("loop_start", np.arange(0, quads.size, 4, dtype=np.int32))
+    # Keep the flat shading of the primitive cube
+    mesh.polygons.foreach_set("use_smooth", np.zeros(len(quads), dtype=bool))
+    mesh.update(calc_edges=True)
+
+    # Enable vertex colors so every copy already has the layer. A float color attribute
+    # stores the float32 buffer as is (the legacy byte layer converts each value to sRGB bytes)
+    mesh.color_attributes.new(BUILDING_COLOR_LAYER, 'FLOAT_COLOR', 'CORNER')
+    return mesh
+
+
+def build_emissive_material():
+    """Create the material shared by all buildings, using the vertex colors as emission."""
+    # The node graph never changes, so a material left by a previous run is reused as is
+    mat = bpy.data.materials.get("Building_Mat")
+    if mat is not None:
+        return mat
+    mat = bpy.data.materials.new(name="Building_Mat")
     mat.use_nodes = True
     nodes = mat.node_tree.nodes
     links = mat.node_tree.links
@@ -114,21 +136,19 @@ def create_building(collection, location, scale):
     mix_shader = nodes.new(type='ShaderNodeMixShader')
     
     # Position nodes for better organization
-    output.location = Vector((300, 0))
-    mix_shader.location = Vector((100, 0))
-    principled.location = Vector((-100, 100))
-    emission.location = Vector((-100, -100))
-    vertex_color.location = Vector((-300, -100))
+    output.location = (300, 0)
+    mix_shader.location = (100, 0)
+    principled.location = (-100, 100)
+    emission.location = (-100, -100)
+    vertex_color.location = (-300, -100)
 
     # Set up node properties
-    vertex_color.layer_name = color_layer.name
+    vertex_color.layer_name = BUILDING_COLOR_LAYER
     principled.inputs['Base Color'].default_value = (0.05, 0.05, 0.07, 1.0)  # Dark building color
     
     # Set Metallic and Roughness
-    if 'Metallic' in principled.inputs:
-        principled.inputs['Metallic'].default_value = 0.2
-    if 'Roughness' in principled.inputs:
-        principled.inputs['Roughness'].default_value = 0.8
+    principled.inputs['Metallic'].default_value = 0.2
+    principled.inputs['Roughness'].default_value = 0.8
     
     # Set up emission strength
     emission.inputs['Strength'].default_value = 5.0  # Increased emission strength
@@ -138,49 +158,57 @@ def create_building(collection, location, scale):
     links.new(principled.outputs['BSDF'], mix_shader.inputs[1])
     links.new(emission.outputs['Emission'], mix_shader.inputs[2])
     
-    # Create a simpler method to use vertex color brightness as mix factor
-    # Instead of RGB2BW node, we'll use a Math node
-    math_node = nodes.new(type='ShaderNodeMath')
-    math_node.location = Vector((-100, 0))
-    math_node.operation = 'ADD'
-    
-    # Create RGB Separate node to get individual RGB components
-    separate_rgb = nodes.new(type='ShaderNodeSeparateRGB')
-    separate_rgb.location = Vector((-300, 0))
-    
-    # Connect vertex color to separate RGB
-    links.new(vertex_color.outputs['Color'], separate_rgb.inputs['Image'])
-    
-    # Add R+G+B and divide by 3 to get approximate brightness
-    links.new(separate_rgb.outputs['R'], math_node.inputs[0])
-    links.new(separate_rgb.outputs['G'], math_node.inputs[1])
-    
-    # Add another Math node for the blue component
-    math_node2 = nodes.new(type='ShaderNodeMath')
-    math_node2.location = Vector((-100, 50))
-    math_node2.operation = 'ADD'
-    
-    links.new(math_node.outputs['Value'], math_node2.inputs[0])
-    links.new(separate_rgb.outputs['B'], math_node2.inputs[1])
-    
-    # Divide by 3 to get average
-    math_node3 = nodes.new(type='ShaderNodeMath')
-    math_node3.location = Vector((0, 50))
-    math_node3.operation = 'DIVIDE'
-    math_node3.inputs[1].default_value = 3.0  # Divide by 3
-    
-    links.new(math_node2.outputs['Value'], math_node3.inputs[0])
-    
-    # Use this brightness value for mix factor
-    links.new(math_node3.outputs['Value'], mix_shader.inputs['Fac'])
+    # Use the vertex color brightness as mix factor with a single RGB to BW node
+    rgb_to_bw = nodes.new(type='ShaderNodeRGBToBW')
+    rgb_to_bw.location = (-100, 0)
+    links.new(vertex_color.outputs['Color'], rgb_to_bw.inputs['Color'])
+    links.new(rgb_to_bw.outputs['Val'], mix_shader.inputs['Fac'])
     
     links.new(mix_shader.outputs['Shader'], output.inputs['Surface'])
 
-    # Assign material to building
-    if building.data.materials:
-        building.data.materials[0] = mat
-    else:
-        building.data.materials.append(mat)
+    return mat
+
+
+def generate_window_colors(template_mesh, count):
+    """Return random per-loop window colors for `count` copies of the template, shape (count, loops, 4)."""
+    # Every building is a copy of the template, so the face layout is read only once
+    n_poly = len(template_mesh.polygons)
+    normals = np.empty(n_poly * 3, dtype=np.float32)
+    template_mesh.polygons.foreach_get("normal", normals)
+    totals = np.empty(n_poly, dtype=np.int32)
+    template_mesh.polygons.foreach_get("loop_total", totals)
+
+    # Only make front/side-facing polygons emissive (windows)
+    # This makes windows appear on vertical faces
+    is_window = np.abs(normals.reshape(n_poly, 3)[:, 2]) < 0.5  # Not top or bottom face
+    # 40% lit, 30% dimly lit, 30% dark; then pick one precomputed color of that category
+    window_probability = RNG.random((count, n_poly))
+    category = np.digitize(window_probability, (0.3, 0.6), right=True)
+    poly_colors = WINDOW_PALETTE[category, RNG.integers(0, WINDOW_PALETTE.shape[1], (count, n_poly))]
+    # Building structure (non-window parts)
+    poly_colors[:, ~is_window] = (0.05, 0.05, 0.07, 1.0)
+
+    # Expand each face's color to all of its loops
+    loop_poly = np.repeat(np.arange(n_poly), totals)
+    # (contiguous per building, so each foreach_set reads its slice without a copy)
+    return np.ascontiguousarray(poly_colors[:, loop_poly])
+
+
+def create_building(collection, template_mesh, index, location, scale, loop_colors):
+    """Create a building with random emissive windows."""
+    # Copy the template mesh so each building keeps its own window colors
+    # (named by a running index rather than by its float coordinates)
+    name = f"Building_{index:03d}"
+    mesh = template_mesh.copy()
+    mesh.name = name
+    building = bpy.data.objects.new(name, mesh)
+    building.location = location
+    building.scale = scale
+    collection.objects.link(building)
+
+    # Assign the precomputed emissive colors to vertices (windows) in a single write
+    color_layer = mesh.color_attributes[BUILDING_COLOR_LAYER]
+    color_layer.data.foreach_set("color", loop_colors.ravel())
 
     return building
 
@@ -189,26 +217,26 @@ def create_city_scene(collection):
     """Create a city scene with multiple buildings."""
     buildings = []
 
-    # Create ground plane
-    bpy.ops.mesh.primitive_plane_add(size=50, location=(0, 0, -0.1))
-    ground = bpy.context.active_object
-    ground.name = "Ground"
-    
-    # Move to our collection
-    old_collection = ground.users_collection[0]
-    old_collection.objects.unlink(ground)
+    # Create ground plane (built from data and linked straight into our collection,
+    # so no operator or active-object lookup is involved)
+    ground_mesh = bpy.data.meshes.new("Ground")
+    half = 25.0
+    ground_mesh.from_pydata(
+        [(-half, -half, 0), (half, -half, 0), (half, half, 0), (-half, half, 0)], [], [(0, 1, 2, 3)]
+    )
+    ground = bpy.data.objects.new("Ground", ground_mesh)
+    ground.location = (0, 0, -0.1)
     collection.objects.link(ground)
     
-    # Add material to ground
-    mat = bpy.data.materials.new(name="Ground_Material")
-    mat.use_nodes = True
+    # Add material to ground (reusing the one from a previous run if present)
+    mat = bpy.data.materials.get("Ground_Material")
+    if mat is None:
+        mat = bpy.data.materials.new(name="Ground_Material")
+        mat.use_nodes = True
     nodes = mat.node_tree.nodes
     principled = nodes["Principled BSDF"]
     principled.inputs['Base Color'].default_value = (0.01, 0.01, 0.015, 1.0)  # Darker ground
-    
-    # Check if 'Roughness' exists before setting
-    if 'Roughness' in principled.inputs:
-        principled.inputs['Roughness'].default_value = 0.95
+    principled.inputs['Roughness'].default_value = 0.95
     
     if ground.data.materials:
         ground.data.materials[0] = mat
@@ -216,42 +244,68 @@ def create_city_scene(collection):
         ground.data.materials.append(mat)
 
     # Create multiple buildings with random positions and scales
-    for i in range(-5, 6, 2):
-        for j in range(-5, 6, 2):
-            # Skip some positions for variation
-            if random.random() < 0.2:  # 20% chance to skip
-                continue
-                
-            location = (i + random.uniform(-0.8, 0.8), 
-                       j + random.uniform(-0.8, 0.8), 
-                       random.uniform(0.5, 3.0))
-            
-            # More varied building sizes
-            height = random.uniform(2.0, 6.0)
-            width = random.uniform(0.6, 1.5)
-            depth = random.uniform(0.6, 1.5)
-            scale = (width, depth, height)
-            
-            building = create_building(collection, location, scale)
-            buildings.append(building)
+    # (all random values are drawn for the whole grid at once)
+    ii, jj = np.meshgrid(np.arange(-5, 6, 2), np.arange(-5, 6, 2), indexing='ij')
+    ii, jj = ii.ravel(), jj.ravel()
+    n = ii.size
+
+    # Skip some positions for variation
+    keep = RNG.random(n) >= 0.2  # 20% chance to skip
+
+    locations = np.stack([ii + RNG.uniform(-0.8, 0.8, n),
+                          jj + RNG.uniform(-0.8, 0.8, n),
+                          RNG.uniform(0.5, 3.0, n)], axis=-1)
+
+    # More varied building sizes
+    heights = RNG.uniform(2.0, 6.0, n)
+    widths = RNG.uniform(0.6, 1.5, n)
+    depths = RNG.uniform(0.6, 1.5, n)
+    scales = np.stack([widths, depths, heights], axis=-1)
+
+    template_mesh = build_building_template()
+    # All buildings share one material; only their vertex colors differ
+    template_mesh.materials.append(build_emissive_material())
+    # Draw the window colors of all buildings in one batch
+    window_colors = generate_window_colors(template_mesh, np.count_nonzero(keep))
+    for index, (location, scale) in enumerate(zip(locations[keep].tolist(), scales[keep].tolist())):
+        building = create_building(collection, template_mesh, index, tuple(location), tuple(scale),
+                                   window_colors[index])
+        buildings.append(building)
+
+    bpy.data.meshes.remove(template_mesh)
+
+    # Evaluate the scene once for all buildings instead of after each one
+    bpy.context.view_layer.update()
 
     return buildings
 
 
+def get_or_create_light(name, light_type):
+    """Return the light data called `name`, creating it only if it does not exist yet."""
+    light = bpy.data.lights.get(name)
+    if light is None:
+        light = bpy.data.lights.new(name, type=light_type)
+    return light
+
+
 def setup_camera_and_lighting():
     """Set up camera and lighting for the scene."""
+    scene = bpy.context.scene
+
     # Create an empty as target
     empty = bpy.data.objects.new("CameraTarget", None)
     empty.location = (0, 0, 3)
-    bpy.context.scene.collection.objects.link(empty)
+    scene.collection.objects.link(empty)
     
-    # Create camera
-    bpy.ops.object.camera_add(location=(15, -15, 10), rotation=(1.0, 0.0, 0.8))
-    camera = bpy.context.active_object
-    camera.name = "NightCamera"
+    # Create camera (reusing the camera data of a previous run if present)
+    camera_data = bpy.data.cameras.get("NightCamera") or bpy.data.cameras.new("NightCamera")
+    camera = bpy.data.objects.new("NightCamera", camera_data)
+    camera.location = (15, -15, 10)
+    camera.rotation_euler = (1.0, 0.0, 0.8)
+    scene.collection.objects.link(camera)
     
     # Make this the active camera
-    bpy.context.scene.camera = camera
+    scene.camera = camera
     
     # Add camera constraint to look at scene center
     track_to = camera.constraints.new(type='TRACK_TO')
@@ -260,16 +314,16 @@ def setup_camera_and_lighting():
     track_to.target = empty
     
     # Add a slight ambient light
-    bpy.ops.object.light_add(type='SUN', location=(0, 0, 10))
-    sun = bpy.context.active_object
-    sun.name = "NightSun"
+    sun = bpy.data.objects.new("NightSun", get_or_create_light("NightSun", 'SUN'))
+    sun.location = (0, 0, 10)
+    scene.collection.objects.link(sun)
     sun.data.energy = 0.05  # Reduced energy for darker scene
     sun.data.color = (0.1, 0.1, 0.2)
     
     # Add a moon light
-    bpy.ops.object.light_add(type='AREA', location=(8, -8, 15))
-    moon = bpy.context.active_object
-    moon.name = "Moon"
+    moon = bpy.data.objects.new("Moon", get_or_create_light("Moon", 'AREA'))
+    moon.location = (8, -8, 15)
+    scene.collection.objects.link(moon)
     moon.data.energy = 10.0  # Increased for more dramatic lighting
     moon.data.color = (0.8, 0.9, 1.0)
     moon.rotation_euler = (0.5, 0.2, 0.8)
@@ -284,17 +338,26 @@ def setup_render_settings():
     render.resolution_x = 1280
     render.resolution_y = 720
     
-    # Check if film_transparent exists before setting
-    if hasattr(render, 'film_transparent'):
-        render.film_transparent = False  # Ensure background is visible
+    render.film_transparent = False  # Ensure background is visible
     
-    # Use Eevee Next for faster rendering
-    bpy.context.scene.render.engine = 'BLENDER_EEVEE_NEXT'
+    # Use Eevee Next for faster rendering (Cycles on CPU when there is no display)
+    scene = bpy.context.scene
+    samples = 16 if QUALITY == "preview" else 32
+    if select_eevee(scene, fallback_samples=samples):
+        # Eevee cost scales almost linearly with the TAA sample count (default 64);
+        # the emissive windows converge quickly, so far fewer samples are enough
+        scene.eevee.taa_render_samples = samples
+
+    # Opaque still image: write 8-bit RGB PNG instead of 16-bit or RGBA
+    render.image_settings.file_format = 'PNG'
+    render.image_settings.color_mode = 'RGB'
+    render.image_settings.color_depth = '8'
+    render.image_settings.compression = 15
     
     # Configure Eevee Next settings for better quality
-    eevee_next = bpy.context.scene.eevee
+    eevee_next = scene.eevee
     
-    # Try to enable specific Eevee Next features if available
+    # Legacy Eevee bloom (removed in Eevee Next, where glare is done in the compositor)
     if hasattr(eevee_next, 'bloom_intensity'):
         eevee_next.bloom_intensity = 0.2  # Increased bloom
         
@@ -370,6 +433,9 @@ def main():
     print(f"Script completed in {end_time - start_time:.2f} seconds")
     print(f"Render saved to: {output_file}")
 
+    # Remove data-blocks left unused by the cleared scene of a previous run
+    bpy.data.orphans_purge(do_local_ids=True, do_linked_ids=True, do_recursive=True)
+
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
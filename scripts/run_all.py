@@ -0,0 +1,82 @@
+"""handson スクリプトをそれぞれ別の Blender プロセスで並列に実行する
+
+使い方:
+    python scripts/run_all.py                      # handson_010〜013 を実行
+    python scripts/run_all.py --gpus 2             # GPU 2 枚に振り分けて実行
+    python scripts/run_all.py handson_011.py handson_012.py
+"""
+
+import argparse
+import os
+import queue
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+# 既定で実行するスクリプト（scripts ディレクトリからの相対パス）
+DEFAULT_SCRIPTS = ("handson_010.py", "handson_011.py", "handson_012.py", "handson_013.py")
+
+# 環境変数 BLENDER が未設定なら PATH 上の blender を使う
+BLENDER = os.environ.get("BLENDER", "blender")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="handson スクリプトを並列にレンダリング")
+    parser.add_argument("scripts", nargs="*", default=DEFAULT_SCRIPTS, help="実行するスクリプト")
+    parser.add_argument(
+        "--gpus",
+        type=int,
+        default=1,
+        help="利用する GPU の枚数（プロセスごとに 1 枚ずつ割り当てる。0 なら GPU を使わず CPU コア数で並列化）",
+    )
+    return parser.parse_args()
+
+
+def run_script(script, gpu_index):
+    # スクリプト内の例外でも Blender が 0 以外で終了するようにする
+    # Blender の "--" 以降はスクリプト側の引数として渡される（負の番号は CPU のみ）
+    command = [
+        BLENDER, "--background", "--python-exit-code", "1", "--python", script,
+        "--", "--gpu-index", str(gpu_index),
+    ]
+    return subprocess.run(command, check=False).returncode
+
+
+def main():
+    args = parse_args()
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    scripts = [os.path.join(script_dir, script) for script in args.scripts]
+
+    # 空いている GPU の番号。タスクは 1 枚を借りて、終わったら返す
+    free_gpus = queue.Queue()
+    if args.gpus > 0:
+        # 1 GPU に 1 プロセスとし、同じ GPU を複数プロセスで取り合わない
+        workers = args.gpus
+        for gpu_index in range(args.gpus):
+            free_gpus.put(gpu_index)
+    else:
+        # GPU を使わせず、CPU だけで並列に実行する
+        workers = min(len(scripts), os.cpu_count() or 1)
+        for _ in range(workers):
+            free_gpus.put(-1)
+
+    def run_on_free_gpu(script):
+        gpu_index = free_gpus.get()
+        try:
+            return run_script(script, gpu_index)
+        finally:
+            free_gpus.put(gpu_index)
+
+    # 各タスクは子プロセスの終了を待つだけなのでスレッドで十分
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        returncodes = list(executor.map(run_on_free_gpu, scripts))
+
+    failed = [script for script, code in zip(args.scripts, returncodes) if code != 0]
+    if failed:
+        print(f"レンダリングに失敗したスクリプト: {failed}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())